@@ -1,6 +1,18 @@
-import pymupdf
+import asyncio
+import io
+import os
+import zipfile
 import streamlit as st
 from scripts import AI_Utilities
+from pdf_utils import extract_text
+from screening import ScreeningRun, content_digest
+from stub_llm import STUB_LLM_ENABLED
+from talent_pool import TalentPool
+
+@st.cache_resource(show_spinner=False)
+def get_talent_pool():
+    """Index of every parsed CV, loaded once and shared by all sessions"""
+    return TalentPool()
 
 # Initialize session state
 if "cv_content" not in st.session_state:
@@ -13,12 +25,73 @@ if "suggestions" not in st.session_state:
     st.session_state["suggestions"] = None
 if "generate_clicked" not in st.session_state:
     st.session_state["generate_clicked"] = False
+if "screening_ranking" not in st.session_state:
+    st.session_state["screening_ranking"] = None
 if "ai_utilities" not in st.session_state:
-    st.session_state["ai_utilities"] = AI_Utilities()  # Store AI Utilities instance
+    st.session_state["ai_utilities"] = AI_Utilities(get_talent_pool())  # Store AI Utilities instance
     
 SUCCESS_SCORE = 85    
 FAILURE_SCORE = 45
 
+@st.cache_data(show_spinner=False, max_entries=200)
+def extract_pdf_text(pdf_bytes):
+    """Extract PDF text once per distinct file content (cached by the hash of the bytes)"""
+    return extract_text(pdf_bytes)
+
+def load_cv_files(uploaded_files, folder):
+    """Collect CV PDFs from uploaded PDFs, uploaded ZIPs and a server folder as {name: bytes}"""
+    cv_files = {}
+    for uploaded_file in uploaded_files or []:
+        if uploaded_file.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(uploaded_file.getvalue())) as archive:
+                for name in archive.namelist():
+                    if name.lower().endswith(".pdf") and not name.startswith("__MACOSX/"):
+                        cv_files[name] = archive.read(name)
+        else:
+            cv_files[uploaded_file.name] = uploaded_file.getvalue()
+    if folder:
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(".pdf"):
+                with open(os.path.join(folder, name), "rb") as f:
+                    cv_files[name] = f.read()
+    return cv_files
+
+async def stream_suggestions(ai_utilities, gaps, placeholder):
+    """Generate the improvement suggestions, showing them as they stream in"""
+    suggestions = ""
+    async for chunk in ai_utilities.astream_suggestions(",".join(gaps)):
+        suggestions += chunk
+        placeholder.markdown(suggestions)
+    return suggestions
+
+async def evaluate_candidate(ai_utilities, jd_content, cv_content, live):
+    """
+    Candidate mode pipeline: suggestion generation starts as soon as the
+    evaluation's gaps are known, overlapping with the rest of the evaluation
+    and with rendering the report.
+    """
+    box = live.container()
+    status = box.empty()
+    status.info("Processing evaluation...")
+    report_placeholder = box.empty()
+    suggestions_placeholder = box.empty()
+    suggestions_task = None
+    evaluation = {}
+    async for event in ai_utilities.astream_evaluation(jd_content, cv_content):
+        if event.get("gaps"):
+            status.info("Generating suggestions...")
+            suggestions_task = asyncio.create_task(
+                stream_suggestions(ai_utilities, event["gaps"], suggestions_placeholder)
+            )
+        if "evaluation" in event:
+            evaluation = event["evaluation"]
+
+    eval_report = ai_utilities.json_to_markdown_report(evaluation) if suggestions_task else None
+    if eval_report:
+        report_placeholder.markdown(eval_report)
+    suggestions = await suggestions_task if suggestions_task else "No gaps found. Your CV is aligned!"
+    return evaluation, eval_report, suggestions
+
 st.set_page_config(
     page_title="AI Resume & JD Analyzer",
     page_icon="👩🏻‍💻",
@@ -35,19 +108,38 @@ st.caption("Optimize your hiring process or enhance your CV with AI.")
 container = st.container(border=False)
 
 with st.sidebar:
-    mode = st.radio("Select Mode", ["Hiring", "Candidate"])
+    mode = st.radio("Select Mode", ["Hiring", "Candidate", "Bulk Screening"])
     groq_api_key = st.text_input(
         "Groq API Key", key="groq_api_key", type="password",
         help="Get your API key from [Groq Platform](https://console.groq.com/keys)"
     )
     
     uploaded_jd_file = st.file_uploader("Upload Job Description (PDF)", key="jd")
-    uploaded_cv_file = st.file_uploader("Upload Candidate CV (PDF)", key="cv")
-    submitted = st.button("Evaluate Fit" if mode == "Hiring" else "Analyze CV")
+    if mode == "Bulk Screening":
+        uploaded_cv_files = st.file_uploader(
+            "Upload Candidate CVs (PDFs or a ZIP)", type=["pdf", "zip"], accept_multiple_files=True, key="cvs"
+        )
+        cv_folder = st.text_input("Or a folder of CV PDFs on the server", key="cv_folder")
+        max_concurrency = st.slider("Concurrent evaluations", min_value=1, max_value=16, value=4)
+        top_k = st.number_input(
+            "Evaluate only the top K matches (0 = all)", min_value=0, value=20,
+            help="CVs are ranked against the JD locally first; only the best matches go to the LLM."
+        )
+        min_match = st.slider(
+            "Minimum match to evaluate", min_value=0.0, max_value=1.0, value=0.0, step=0.05,
+            help="Relevance relative to the best matching CV (1.0)."
+        )
+        match_pool = st.checkbox(f"Also match the whole talent pool ({len(get_talent_pool())} CVs)")
+        screen_clicked = st.button("Screen Candidates")
+        submitted = False
+    else:
+        uploaded_cv_file = st.file_uploader("Upload Candidate CV (PDF)", key="cv")
+        submitted = st.button("Evaluate Fit" if mode == "Hiring" else "Analyze CV")
+        screen_clicked = False
 
 # Main App Logic
 if submitted:
-    if not groq_api_key:
+    if not groq_api_key and not STUB_LLM_ENABLED:
         st.error("Please provide a Groq API key.")
     elif not uploaded_jd_file or not uploaded_cv_file:
         st.error("Both Job Description and CV are required.")
@@ -57,34 +149,92 @@ if submitted:
         container.empty()
         try:
             # Extract PDF content and store in session state
-            with pymupdf.open(stream=uploaded_jd_file.read(), filetype="pdf") as pdf:
-                jd_content = "\n\n".join(page.get_text("text") for page in pdf)
-            
-            with pymupdf.open(stream=uploaded_cv_file.read(), filetype="pdf") as pdf:
-                cv_content = "\n\n".join(page.get_text("text") for page in pdf)
-                st.session_state["cv_content"] = cv_content
+            jd_content = extract_pdf_text(uploaded_jd_file.getvalue())
+            cv_content = extract_pdf_text(uploaded_cv_file.getvalue())
+            st.session_state["cv_content"] = cv_content
             
             if mode == "Hiring":
-                evaluation = st.session_state["ai_utilities"].evaluate(jd_content, cv_content, False)
-                container.write(evaluation)
+                container.write_stream(st.session_state["ai_utilities"].stream_evaluation_report(jd_content, cv_content))
             else:
-                with st.spinner("Processing evaluation..."):
-                    evaluation_json = st.session_state["ai_utilities"].evaluate(jd_content, cv_content, True)
+                live = container.empty()
+                evaluation_json, eval_report, suggestions = asyncio.run(
+                    evaluate_candidate(st.session_state["ai_utilities"], jd_content, cv_content, live)
+                )
+                live.empty()
                 st.session_state["evaluation"] = evaluation_json
-                score = evaluation_json.get("overall_score", 0)
-                gaps = evaluation_json.get("gaps", [])
-                if gaps:
-                    eval_report = st.session_state["ai_utilities"].json_to_markdown_report(evaluation_json)
-                    with st.spinner("Generating suggestions..."):
-                        suggestions = st.session_state["ai_utilities"].generate_suggestions(",".join(gaps))
-                    st.session_state["suggestions"] = suggestions
+                st.session_state["suggestions"] = suggestions
+                if eval_report:
                     st.session_state["evaluation_report"] = eval_report
-                else:
-                    st.session_state["suggestions"] = "No gaps found. Your CV is aligned!"
         
         except Exception as e:
             st.error(f"Error processing files: {e}")
 
+# Bulk Screening Workflow
+if screen_clicked:
+    if not groq_api_key and not STUB_LLM_ENABLED:
+        st.error("Please provide a Groq API key.")
+    elif not uploaded_jd_file or not (uploaded_cv_files or cv_folder or match_pool):
+        st.error("A Job Description and at least one CV (or the talent pool) are required.")
+    elif cv_folder and not os.path.isdir(cv_folder):
+        st.error(f"Folder not found: {cv_folder}")
+    else:
+        ai_utilities = st.session_state["ai_utilities"]
+        ai_utilities.initialize_llm(groq_api_key)
+        container.empty()
+        try:
+            jd_content = extract_pdf_text(uploaded_jd_file.getvalue())
+            run = ScreeningRun(jd_content)
+
+            # Skip CVs this JD was already screened against, so an interrupted run resumes
+            cvs = {}
+            for name, pdf_bytes in load_cv_files(uploaded_cv_files, cv_folder).items():
+                try:
+                    cv_content = extract_pdf_text(pdf_bytes)
+                except Exception as e:
+                    run.record(name, content_digest(pdf_bytes), error=f"Could not read PDF: {e}")
+                    continue
+                if content_digest(cv_content) not in run.completed:
+                    cvs[name] = cv_content
+
+            container.info(f"{len(cvs)} CVs to screen, {len(run.completed)} already screened for this job description.")
+            progress = container.progress(0.0)
+            ranking_table = container.empty()
+            ranking_table.dataframe(run.ranking(), hide_index=True, use_container_width=True)
+
+            with st.spinner("Screening candidates..."):
+                screened = ai_utilities.screen_candidates(jd_content, cvs, max_concurrency, top_k, min_match)
+                for done, result in enumerate(screened, 1):
+                    run.record(
+                        result["name"], result["digest"], result.get("evaluation"), result.get("error"),
+                        result.get("match_score"), result.get("shortlisted", True)
+                    )
+                    progress.progress(done / len(cvs), text=f"Screened {done} of {len(cvs)}")
+                    ranking_table.dataframe(run.ranking(), hide_index=True, use_container_width=True)
+
+                if match_pool:
+                    progress.progress(0.0, text="Matching the talent pool...")
+                    exclude = run.completed | {content_digest(cv_content) for cv_content in cvs.values()}
+                    for result in ai_utilities.match_talent_pool(jd_content, max_concurrency, top_k, min_match, exclude):
+                        run.record(
+                            result["name"], result["digest"], result.get("evaluation"), result.get("error"),
+                            result.get("match_score"), result.get("shortlisted", True)
+                        )
+                        ranking_table.dataframe(run.ranking(), hide_index=True, use_container_width=True)
+                    progress.progress(1.0, text="Talent pool matched")
+            st.session_state["screening_ranking"] = run.ranking()
+        except Exception as e:
+            st.error(f"Error screening candidates: {e}")
+elif mode == "Bulk Screening" and st.session_state["screening_ranking"] is not None:
+    container.dataframe(st.session_state["screening_ranking"], hide_index=True, use_container_width=True)
+
+if mode == "Bulk Screening" and st.session_state["screening_ranking"] is not None:
+    st.download_button(
+        "Download Ranking (CSV)",
+        data=st.session_state["screening_ranking"].to_csv(index=False),
+        file_name="candidate_ranking.csv",
+        mime="text/csv"
+    )
+
 # Candidate Mode Workflow
 if mode == "Candidate" and st.session_state.get("evaluation"):
     score = st.session_state["evaluation"].get("overall_score", 0)
@@ -122,15 +272,16 @@ if st.session_state.get("generate_clicked"):
     container.empty()
     try:
         if st.session_state["evaluation"] and st.session_state["suggestions"]:
-            with st.spinner("Generating your updated CV..."):
-                updated_cv = st.session_state["ai_utilities"].rewrite_cv(
-                    st.session_state["cv_content"],
-                    st.session_state["suggestions"],
-                    st.session_state["evaluation"].get("jd_summary", "")
-                )
-            
             container.markdown("### Updated CV")
-            container.code(updated_cv, language="markdown")
+            cv_placeholder = container.empty()
+            updated_cv = ""
+            for chunk in st.session_state["ai_utilities"].stream_rewrite_cv(
+                st.session_state["cv_content"],
+                st.session_state["suggestions"],
+                st.session_state["evaluation"].get("jd_summary", "")
+            ):
+                updated_cv += chunk
+                cv_placeholder.code(updated_cv, language="markdown")
             st.download_button(
                 "Download Improved CV",
                 data=updated_cv,
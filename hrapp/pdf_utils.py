@@ -0,0 +1,30 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+
+# Shorter documents are extracted inline: starting worker processes costs more than it saves
+PARALLEL_PAGE_THRESHOLD = 8
+
+
+def _extract_page_range(pdf_bytes, start, stop):
+    """Extract the text of pages [start, stop), runs in a worker process"""
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as pdf:
+        return [pdf[number].get_text("text") for number in range(start, stop)]
+
+
+def extract_text(pdf_bytes, max_workers=None):
+    """Extract the text of a PDF page by page, spreading long documents over worker processes"""
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as pdf:
+        page_count = pdf.page_count
+        if page_count < PARALLEL_PAGE_THRESHOLD:
+            return "\n\n".join(page.get_text("text") for page in pdf)
+
+    # PyMuPDF is not thread safe, so pages are split into contiguous ranges across processes
+    workers = min(max_workers or os.cpu_count() or 1, page_count)
+    chunk_size = -(-page_count // workers)
+    starts = list(range(0, page_count, chunk_size))
+    stops = [min(start + chunk_size, page_count) for start in starts]
+    with ProcessPoolExecutor(max_workers=len(starts)) as pool:
+        chunks = pool.map(_extract_page_range, [pdf_bytes] * len(starts), starts, stops)
+        return "\n\n".join(text for chunk in chunks for text in chunk)
@@ -0,0 +1,26 @@
+import re
+from typing import List
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class CandidateEvaluation(BaseModel):
+    """Schema of the JSON evaluation (Prompts.EVALUATION_PROMPT_JSON), validated before it reaches the UI"""
+
+    candidate_name: str = "Unknown"
+    job_title: str = "N/A"
+    overall_score: int = Field(ge=0, le=100)
+    experience_penalty: str = "N"
+    critical_penalties: List[str] = []
+    positives: List[str] = []
+    gaps: List[str] = []
+    recommendation: str
+
+    @field_validator("overall_score", mode="before")
+    @classmethod
+    def _score_from_text(cls, value):
+        """The template shows the score as "[X]", so models sometimes answer "[78]" or "78%" """
+        if isinstance(value, str):
+            match = re.search(r"\d+", value)
+            return match.group() if match else value
+        return value
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+
+# Checkpoints of bulk screening runs, one file per job description
+RUNS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "screening_runs")
+
+RANKING_COLUMNS = [
+    "rank", "file", "candidate_name", "overall_score", "match_score", "shortlisted", "recommendation", "gaps", "error"
+]
+
+
+def content_digest(content):
+    """Digest of extracted CV text (or raw bytes when the PDF could not be read)"""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def _score(value):
+    """overall_score comes back as text such as "78" or "[78]"; missing scores rank last"""
+    match = re.search(r"\d+", str(value))
+    return int(match.group()) if match else None
+
+
+class ScreeningRun:
+    """Results of screening many CVs against one JD, checkpointed so an interrupted run resumes"""
+
+    def __init__(self, jd_content, runs_dir=RUNS_DIR):
+        os.makedirs(runs_dir, exist_ok=True)
+        self.path = os.path.join(runs_dir, f"{content_digest(jd_content)[:16]}.jsonl")
+        self.results = {}  # CV content digest -> result row
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partially written line from an interrupted run
+                    self.results[row["cv_digest"]] = row
+
+    @property
+    def completed(self):
+        """Digests of CVs already evaluated successfully"""
+        return {
+            digest for digest, row in self.results.items()
+            if not row.get("error") and row.get("shortlisted", True)
+        }
+
+    def record(self, file_name, cv_digest, evaluation=None, error=None, match_score=None, shortlisted=True):
+        """Store the outcome for one CV and append it to the checkpoint"""
+        evaluation = evaluation or {}
+        row = {
+            "cv_digest": cv_digest,
+            "file": file_name,
+            "candidate_name": evaluation.get("candidate_name", ""),
+            "overall_score": _score(evaluation.get("overall_score")),
+            "match_score": round(match_score, 3) if match_score is not None else None,
+            "shortlisted": shortlisted,
+            "recommendation": evaluation.get("recommendation", ""),
+            "gaps": ", ".join(evaluation.get("gaps", [])),
+            "error": str(error) if error else ""
+        }
+        self.results[row["cv_digest"]] = row
+        with open(self.path, "a") as f:
+            f.write(json.dumps(row) + "\n")
+        return row
+
+    def ranking(self):
+        """Results ranked by overall score, then by pre-filter match, best first"""
+        table = pd.DataFrame(list(self.results.values()), columns=RANKING_COLUMNS[1:])
+        table["overall_score"] = table["overall_score"].astype("Int64")
+        table = table.sort_values(
+            ["overall_score", "match_score"], ascending=False, na_position="last"
+        ).reset_index(drop=True)
+        table.insert(0, "rank", range(1, len(table) + 1))
+        return table
@@ -1,15 +1,36 @@
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
+from langchain_core.exceptions import OutputParserException
+from langchain_core.utils.json import parse_json_markdown, parse_partial_json
 from langchain_core.runnables import RunnableParallel
 from prompts import Prompts
-import re
+from stub_llm import STUB_LLM_ENABLED, StubChatModel
+from screening import content_digest
+from talent_pool import shortlist
+from schemas import CandidateEvaluation
+import hashlib
+import json
+
+# Extra attempts at the JSON evaluation when the model's output fails validation.
+# Parsed summaries are cached, so a retry costs one evaluation call.
+EVALUATION_RETRIES = 2
 
 class AI_Utilities:
 
+    def __init__(self, talent_pool=None):
+        # Parsed JD/CV summaries keyed by document type, model and content hash
+        self.summary_cache = {}
+        # Persisted index of parsed CVs used to shortlist candidates before evaluation
+        self.talent_pool = talent_pool
+
     def initialize_llm(self,api_key):
         """Initialize Groq LLM with configured model"""
 
+        if STUB_LLM_ENABLED:
+            self.llm = StubChatModel()
+            return
+
         self.llm =  ChatGroq(
             temperature=0,
             groq_api_key=api_key,
@@ -24,48 +45,101 @@ class AI_Utilities:
         ])
         return template | llm | StrOutputParser()
 
-    def evaluate(self, jd_content, cv_content,candiateMode):
-        """Evaluate JD vs CV using parallel chain processing"""
-       
-        
-        # Create parsing chains
-        jd_chain = self.__create_chain(
+    def __content_key(self, kind, content):
+        """Cache key for a parsed document: same text and model give the same summary"""
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return (kind, self.llm.model_name, digest)
+
+    def __jd_parsing_chain(self):
+        return self.__create_chain(
             self.llm, Prompts.JD_PARSING_SYSTEM_PROMPT, Prompts.JD_PARSING_PROMPT
         )
-        cv_chain = self.__create_chain(
+
+    def __cv_parsing_chain(self):
+        return self.__create_chain(
             self.llm, Prompts.RESUME_PARSING_SYSTEM_PROMPT, Prompts.RESUME_PARSING_PROMPT
         )
-        
-        # Run parallel parsing
-        parallel = RunnableParallel(
-            jd_summary=jd_chain, 
-            cv_summary=cv_chain
+
+    def __json_evaluation_text_chain(self, json_mode=True):
+        """Candidate evaluation as raw JSON text, with the model in JSON mode unless json_mode is False"""
+        return self.__create_chain(
+            self.llm.bind(response_format={"type": "json_object"}) if json_mode else self.llm,
+            Prompts.EVALUATION_SYSTEM_PROMPT_JSON,
+            Prompts.EVALUATION_PROMPT_JSON
         )
-        parsed_data = parallel.invoke({
+
+    def __json_evaluation_chain(self):
+        """Candidate evaluation as a validated dict, retrying only this step on invalid output"""
+        return (self.__json_evaluation_text_chain() | self.__parse_evaluation).with_retry(
+            retry_if_exception_type=(OutputParserException,),
+            wait_exponential_jitter=False,
+            stop_after_attempt=1 + EVALUATION_RETRIES
+        )
+
+    def parse_jd(self, jd_content):
+        """Summarise a JD on its own, reusing the summary if it was parsed before"""
+        jd_key = self.__content_key("jd", jd_content)
+        if jd_key not in self.summary_cache:
+            self.summary_cache[jd_key] = self.__jd_parsing_chain().invoke({"jd_content": jd_content})
+        return self.summary_cache[jd_key]
+
+    def __pending_parsing_chains(self, jd_key, cv_key):
+        """Parsing chains for the documents missing from the cache"""
+        chains = {}
+        if jd_key not in self.summary_cache:
+            chains["jd_summary"] = self.__jd_parsing_chain()
+        if cv_key not in self.summary_cache:
+            chains["cv_summary"] = self.__cv_parsing_chain()
+        return chains
+
+    def __store_parsed(self, jd_key, cv_key, parsed_data):
+        if "jd_summary" in parsed_data:
+            self.summary_cache[jd_key] = parsed_data["jd_summary"]
+        if "cv_summary" in parsed_data:
+            self.summary_cache[cv_key] = parsed_data["cv_summary"]
+        return {
+            "jd_summary": self.summary_cache[jd_key],
+            "cv_summary": self.summary_cache[cv_key]
+        }
+
+    def parse_documents(self, jd_content, cv_content):
+        """Summarise the JD and CV, only running the parsing chains for documents not parsed before"""
+        jd_key = self.__content_key("jd", jd_content)
+        cv_key = self.__content_key("cv", cv_content)
+
+        # Run parallel parsing
+        chains = self.__pending_parsing_chains(jd_key, cv_key)
+        parsed_data = RunnableParallel(**chains).invoke({
             "jd_content": jd_content,
             "cv_content": cv_content
-        })
+        }) if chains else {}
+        return self.__store_parsed(jd_key, cv_key, parsed_data)
+
+    async def aparse_documents(self, jd_content, cv_content):
+        """Async version of parse_documents"""
+        jd_key = self.__content_key("jd", jd_content)
+        cv_key = self.__content_key("cv", cv_content)
+
+        chains = self.__pending_parsing_chains(jd_key, cv_key)
+        parsed_data = await RunnableParallel(**chains).ainvoke({
+            "jd_content": jd_content,
+            "cv_content": cv_content
+        }) if chains else {}
+        return self.__store_parsed(jd_key, cv_key, parsed_data)
+
+    def evaluate(self, jd_content, cv_content,candiateMode):
+        """Evaluate JD vs CV using parallel chain processing"""
+       
+        
+        parsed_data = self.parse_documents(jd_content, cv_content)
         
         # Evaluate parsed data
         if candiateMode:
-            evaluation_chain = self.__create_chain(
-                    self.llm, Prompts.EVALUATION_SYSTEM_PROMPT_JSON, Prompts.EVALUATION_PROMPT_JSON)
-            
-            
-                
-            json_output =  evaluation_chain.invoke({
+            evaluation = self.__json_evaluation_chain().invoke({
                 "jd_summary": parsed_data["jd_summary"],
                 "resume_summary": parsed_data["cv_summary"]
             })
-            cleanJson =  self.__clean_json_string(json_output)
-            try:
-                import json
-                evaluation = json.loads(cleanJson)
-                evaluation['jd_summary'] = parsed_data["jd_summary"]
-            except json.JSONDecodeError:
-                
-                evaluation = {}
-                
+            evaluation['jd_summary'] = parsed_data["jd_summary"]
             return evaluation
         else:
             evaluation_chain = self.__create_chain(
@@ -78,6 +152,139 @@ class AI_Utilities:
                 "resume_summary": parsed_data["cv_summary"]
             })
             
+    def stream_evaluation_report(self, jd_content, cv_content):
+        """Hiring mode evaluation, yielding the markdown report as it is generated"""
+        parsed_data = self.parse_documents(jd_content, cv_content)
+        evaluation_chain = self.__create_chain(
+            self.llm, Prompts.EVALUATION_SYSTEM_PROMPT, Prompts.EVALUATION_PROMPT)
+        yield from evaluation_chain.stream({
+            "jd_summary": parsed_data["jd_summary"],
+            "resume_summary": parsed_data["cv_summary"]
+        })
+
+    async def astream_evaluation(self, jd_content, cv_content):
+        """
+        Candidate mode evaluation as an async stream of events.
+
+        Yields {"gaps": [...]} as soon as the gaps list in the streamed JSON is
+        complete, so suggestions can start before the evaluation finishes,
+        then {"evaluation": {...}} with the same result as evaluate().
+        """
+        parsed_data = await self.aparse_documents(jd_content, cv_content)
+        # Groq's JSON mode does not support streaming, so the streamed answer relies on the prompt
+        # asking for JSON only; it is validated below, and re-requested in JSON mode if invalid
+        evaluation_chain = self.__json_evaluation_text_chain(json_mode=False)
+
+        inputs = {
+            "jd_summary": parsed_data["jd_summary"],
+            "resume_summary": parsed_data["cv_summary"]
+        }
+        json_output, gaps_sent = "", False
+        async for chunk in evaluation_chain.astream(inputs):
+            json_output += chunk
+            if gaps_sent:
+                continue
+            try:
+                partial = parse_json_markdown(json_output, parser=parse_partial_json)
+            except (json.JSONDecodeError, OutputParserException):
+                continue
+            # The gaps list is complete once the model has moved on to a later key
+            keys = list(partial) if isinstance(partial, dict) else []
+            if "gaps" in keys and keys.index("gaps") < len(keys) - 1:
+                gaps_sent = True
+                yield {"gaps": partial["gaps"]}
+
+        try:
+            evaluation = self.__parse_evaluation(json_output)
+        except OutputParserException:
+            # Only the evaluation is re-requested; the parsed summaries come from the cache
+            evaluation = await self.__json_evaluation_chain().ainvoke(inputs)
+        evaluation['jd_summary'] = parsed_data["jd_summary"]
+        if not gaps_sent:
+            yield {"gaps": evaluation.get("gaps", [])}
+        yield {"evaluation": evaluation}
+
+    def screen_candidates(self, jd_content, cvs, max_concurrency=4, top_k=None, min_match=None):
+        """
+        Rank many CVs against one JD.
+
+        The JD is parsed once and CVs not seen before are parsed, with at most
+        max_concurrency CVs in flight. With a talent pool, CVs are then scored
+        against the JD summary locally and only the top_k / those at or above
+        min_match go through the LLM evaluation. Yields one result dict per CV
+        as it finishes.
+        """
+        jd_summary = self.parse_jd(jd_content)
+        digests = {name: content_digest(cv_content) for name, cv_content in cvs.items()}
+
+        # Parse the CVs whose summaries are neither in the talent pool nor in this session's cache
+        summaries, to_parse = {}, []
+        for name in cvs:
+            pooled = self.talent_pool.summary(digests[name]) if self.talent_pool is not None else None
+            summary = pooled or self.summary_cache.get(self.__content_key("cv", cvs[name]))
+            if not summary:
+                to_parse.append(name)
+                continue
+            summaries[name] = summary
+            # Only pooled CVs are scored for the shortlist, so cached ones join the pool too
+            if self.talent_pool is not None and not pooled:
+                self.talent_pool.add(digests[name], name, summary)
+
+        cv_chain = self.__cv_parsing_chain()
+        parsed = cv_chain.batch_as_completed(
+            [{"cv_content": cvs[name]} for name in to_parse],
+            config={"max_concurrency": max_concurrency}, return_exceptions=True
+        )
+        for index, output in parsed:
+            name = to_parse[index]
+            if isinstance(output, Exception):
+                yield {"name": name, "digest": digests[name], "error": output}
+                continue
+            summaries[name] = output
+            self.summary_cache[self.__content_key("cv", cvs[name])] = output
+            if self.talent_pool is not None:
+                self.talent_pool.add(digests[name], name, output)
+
+        candidates = [
+            {"name": name, "digest": digests[name], "summary": summary} for name, summary in summaries.items()
+        ]
+        yield from self.__evaluate_shortlist(jd_summary, candidates, max_concurrency, top_k, min_match)
+
+    def match_talent_pool(self, jd_content, max_concurrency=4, top_k=None, min_match=None, exclude=()):
+        """Match a JD against every CV in the talent pool, evaluating only the shortlist"""
+        jd_summary = self.parse_jd(jd_content)
+        candidates = [
+            {"name": candidate["file"], "digest": candidate["digest"], "summary": candidate["summary"]}
+            for candidate in self.talent_pool.candidates() if candidate["digest"] not in exclude
+        ]
+        yield from self.__evaluate_shortlist(jd_summary, candidates, max_concurrency, top_k, min_match)
+
+    def __evaluate_shortlist(self, jd_summary, candidates, max_concurrency, top_k, min_match):
+        """Pre-filter parsed candidates against the JD, then evaluate the shortlist concurrently"""
+        if self.talent_pool is not None:
+            scores = self.talent_pool.match(jd_summary, [candidate["digest"] for candidate in candidates])
+            selected = set(shortlist(scores, top_k, min_match))
+        else:
+            scores, selected = {}, {candidate["digest"] for candidate in candidates}
+
+        shortlisted = []
+        for candidate in candidates:
+            candidate["match_score"] = scores.get(candidate["digest"])
+            if candidate["digest"] in selected:
+                shortlisted.append(candidate)
+            else:
+                yield {**candidate, "shortlisted": False}
+
+        evaluations = self.__json_evaluation_chain().batch_as_completed(
+            [{"jd_summary": jd_summary, "resume_summary": candidate["summary"]} for candidate in shortlisted],
+            config={"max_concurrency": max_concurrency}, return_exceptions=True
+        )
+        for index, output in evaluations:
+            if isinstance(output, Exception):
+                yield {**shortlisted[index], "shortlisted": True, "error": output}
+            else:
+                yield {**shortlisted[index], "shortlisted": True, "evaluation": output}
+
     def generate_suggestions(self,gaps):
         """Generate actionable CV improvement suggestions"""
         
@@ -89,15 +296,34 @@ class AI_Utilities:
         
         return suggestions_chain.invoke({"gaps": gaps})
 
-    def rewrite_cv(self, cv_content, suggestions, job_requirements):
-       
-        cv_chain = self.__create_chain(
+    async def astream_suggestions(self, gaps):
+        """Async version of generate_suggestions, yielding the suggestions as they are generated"""
+        suggestions_chain = self.__create_chain(
+            self.llm,
+            Prompts.SUGGESTIONS_SYSTEM_PROMPT,
+            Prompts.SUGGESTIONS_HUMAN_PROMPT
+        )
+        async for chunk in suggestions_chain.astream({"gaps": gaps}):
+            yield chunk
+
+    def __cv_rewrite_chain(self):
+        return self.__create_chain(
             self.llm,
             Prompts.CV_REWRITE_SYSTEM_PROMPT,
             Prompts.CV_REWRITE_HUMAN_PROMPT
         )
-        
-        return cv_chain.invoke({
+
+    def rewrite_cv(self, cv_content, suggestions, job_requirements):
+       
+        return self.__cv_rewrite_chain().invoke({
+            "original_cv": cv_content,
+            "suggestions": suggestions,
+            "job_requirements": job_requirements
+        })
+
+    def stream_rewrite_cv(self, cv_content, suggestions, job_requirements):
+        """Rewrite the CV, yielding the new CV as it is generated"""
+        yield from self.__cv_rewrite_chain().stream({
             "original_cv": cv_content,
             "suggestions": suggestions,
             "job_requirements": job_requirements
@@ -127,7 +353,6 @@ class AI_Utilities:
 {gaps_block}
     """
 
-    def __clean_json_string(self,json_string):
-        pattern = r'^```json\s*(.*?)\s*```$'
-        cleaned_string = re.sub(pattern, r'\1', json_string, flags=re.DOTALL)
-        return cleaned_string.strip()
\ No newline at end of file
+    def __parse_evaluation(self, json_output):
+        """Validate the JSON evaluation returned by the LLM against CandidateEvaluation and turn it into a dict"""
+        return PydanticOutputParser(pydantic_object=CandidateEvaluation).parse(json_output).model_dump()
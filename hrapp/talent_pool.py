@@ -0,0 +1,128 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Parsed CV summaries of every candidate seen so far, shared by all sessions
+POOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "talent_pool")
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or",
+    "the", "to", "with", "years", "year", "experience", "skills", "required", "name", "summary"
+}
+
+
+def _tokenize(text):
+    """Lower-case terms, keeping tech names such as c++, c# and .net intact"""
+    terms = re.findall(r"[a-z0-9][a-z0-9+#.]*", text.lower())
+    return [term.rstrip(".") for term in terms if term.rstrip(".") not in STOPWORDS]
+
+
+class TalentPool:
+    """
+    Persisted BM25 index over parsed CV summaries.
+
+    Used to rank CVs against a parsed JD summary locally, so only a shortlist
+    goes through the LLM evaluation.
+    """
+
+    def __init__(self, pool_dir=POOL_DIR):
+        os.makedirs(pool_dir, exist_ok=True)
+        self.path = os.path.join(pool_dir, "pool.jsonl")
+        self._lock = threading.Lock()
+        self._candidates = {}  # CV digest -> {"digest", "file", "summary"}
+        self._index = None  # Built lazily, invalidated when candidates are added
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        candidate = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partially written line from an interrupted run
+                    self._candidates[candidate["digest"]] = candidate
+
+    def __len__(self):
+        return len(self._candidates)
+
+    def summary(self, digest):
+        """Parsed summary of a CV already in the pool, or None"""
+        candidate = self._candidates.get(digest)
+        return candidate["summary"] if candidate else None
+
+    def candidates(self):
+        return list(self._candidates.values())
+
+    def add(self, digest, file_name, summary):
+        """Add a parsed CV to the pool and persist it"""
+        candidate = {"digest": digest, "file": file_name, "summary": summary}
+        with self._lock:
+            self._candidates[digest] = candidate
+            self._index = None
+            with open(self.path, "a") as f:
+                f.write(json.dumps(candidate) + "\n")
+
+    def __build_index(self):
+        """BM25 weight matrix (candidates x terms), so a query is a column sum"""
+        digests = list(self._candidates)
+        vocabulary, rows, columns, counts = {}, [], [], []
+        for row, digest in enumerate(digests):
+            for term, count in Counter(_tokenize(self._candidates[digest]["summary"])).items():
+                rows.append(row)
+                columns.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+
+        term_frequencies = csr_matrix(
+            (np.asarray(counts, dtype=np.float32), (rows, columns)), shape=(len(digests), len(vocabulary))
+        )
+        document_frequencies = np.bincount(columns, minlength=len(vocabulary))
+        idf = np.log(1 + (len(digests) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+        lengths = np.asarray(term_frequencies.sum(axis=1)).ravel()
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+
+        entry_rows = np.repeat(np.arange(len(digests)), np.diff(term_frequencies.indptr))
+        tf = term_frequencies.data
+        weights = term_frequencies.copy()
+        weights.data = idf[term_frequencies.indices] * tf * (BM25_K1 + 1) / (tf + length_norm[entry_rows])
+        return {"digests": digests, "positions": {d: i for i, d in enumerate(digests)},
+                "vocabulary": vocabulary, "weights": weights.tocsc()}
+
+    def match(self, jd_summary, digests=None):
+        """
+        Score pool CVs against a JD summary.
+
+        Returns {digest: relevance} with relevance scaled to 0-1 (1 = best match),
+        for the given digests or the whole pool.
+        """
+        with self._lock:
+            if self._index is None and self._candidates:
+                self._index = self.__build_index()
+            index = self._index
+        if index is None:
+            return {}
+
+        terms = sorted({index["vocabulary"][t] for t in _tokenize(jd_summary) if t in index["vocabulary"]})
+        scores = np.asarray(index["weights"][:, terms].sum(axis=1)).ravel() if terms else np.zeros(len(index["digests"]))
+        best = scores.max() if len(scores) else 0.0
+        relevance = scores / best if best > 0 else scores
+
+        if digests is None:
+            digests = index["digests"]
+        return {d: float(relevance[index["positions"][d]]) for d in digests if d in index["positions"]}
+
+
+def shortlist(scores, top_k=None, min_match=None):
+    """Digests that go to the LLM evaluator: the top_k best, and only those at or above min_match"""
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    if min_match:
+        ranked = [digest for digest in ranked if scores[digest] >= min_match]
+    if top_k:
+        ranked = ranked[:top_k]
+    return ranked
@@ -49,18 +49,8 @@ class ELI5Agent:
             return str(crew_output.output)
         return str(crew_output)
 
-    def explain(self, user_prompt: str) -> tuple[str, dict]:
-        # Check cache first
-        if self.cache_enabled:
-            cached_response = load_response(user_prompt)
-            if cached_response:
-                return cached_response["response"], {
-                    "cached": True,
-                    "model": self.model,
-                    "temperature": self.temperature,
-                    "timestamp": cached_response.get("timestamp", datetime.now().isoformat())
-                }
-
+    def _generate(self, user_prompt: str) -> str:
+        """Run the question through the LLM crew and return the raw explanation."""
         # Create agent and task
         agent = self.__createAgent()
         task = self.__createTask(agent)
@@ -74,7 +64,21 @@ class ELI5Agent:
         crew_output = crew.kickoff({"question": user_prompt})
         
         # Extract the text content from the CrewOutput
-        response_text = self._extract_response_text(crew_output)
+        return self._extract_response_text(crew_output)
+
+    def explain(self, user_prompt: str) -> tuple[str, dict]:
+        # Check cache first
+        if self.cache_enabled:
+            cached_response = load_response(user_prompt)
+            if cached_response:
+                return cached_response["response"], {
+                    "cached": True,
+                    "model": self.model,
+                    "temperature": self.temperature,
+                    "timestamp": cached_response.get("timestamp", datetime.now().isoformat())
+                }
+
+        response_text = self._generate(user_prompt)
 
         # Prepare metadata
         metadata = {
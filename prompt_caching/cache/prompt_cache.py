@@ -1,18 +1,27 @@
 import os
 import json
 import hashlib
+import threading
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
 CACHE_DIR = "./cache/data"
+PACK_FILE = "pack.npz"  # Dense segment written by compaction and import
 SIMILARITY_THRESHOLD = 0.85  # Adjust this threshold as needed
+COMPACTION_EPSILON = 0.02  # Max cosine distance between entries merged by compaction
 os.makedirs(CACHE_DIR, exist_ok=True)
 
 # Initialize the sentence transformer model
 model = SentenceTransformer('all-MiniLM-L6-v2')
 
+# In-memory view of the on-disk cache used for lookups. It is rebuilt whenever
+# the cache changes underneath us (e.g. another process wrote an entry), so the
+# files on disk stay the source of truth.
+_index_lock = threading.Lock()
+_index: Dict[str, Any] = {"signature": None, "keys": [], "positions": {}, "entries": [], "matrix": None}
+
 def _hash_key(prompt: str) -> str:
     """Generate a hash key for the prompt."""
     return hashlib.md5(prompt.strip().lower().encode()).hexdigest()
@@ -25,13 +34,135 @@ def _compute_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float
     """Compute cosine similarity between two embeddings."""
     return float(np.dot(embedding1, embedding2) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2)))
 
-def load_response(prompt: str, use_semantic_search: bool = True) -> Optional[Dict[str, Any]]:
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so cosine similarity becomes a dot product."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _cache_signature() -> Tuple[int, int, int]:
+    """
+    Fingerprint of the files on disk: the directory mtime catches entries added or
+    removed, the newest file mtime catches entries overwritten in place (which
+    leaves the directory mtime unchanged on POSIX).
+    """
+    newest, count = 0, 0
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.json') or entry.name == PACK_FILE:
+                newest = max(newest, entry.stat().st_mtime_ns)
+                count += 1
+    return os.stat(CACHE_DIR).st_mtime_ns, newest, count
+
+def _loose_files() -> List[str]:
+    return sorted(f for f in os.listdir(CACHE_DIR) if f.endswith('.json'))
+
+def _read_pack(path: str) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """Read a pack/archive: entries without embeddings plus their embedding matrix."""
+    with np.load(path) as pack:
+        entries = json.loads(str(pack["entries"]))
+        matrix = pack["embeddings"].astype(np.float32)
+    if len(entries) != len(matrix):
+        raise ValueError(f"Corrupt cache archive {path}: {len(entries)} entries but {len(matrix)} embeddings")
+    return entries, matrix
+
+def _write_pack(path: str, entries: List[Dict[str, Any]], matrix: Optional[np.ndarray]) -> None:
+    """Atomically write entries and their (unit-normalized) embeddings as one compressed file."""
+    if matrix is None:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, entries=np.array(json.dumps(entries)), embeddings=matrix.astype(np.float32))
+    os.replace(tmp_path, path)
+
+def _rebuild_index() -> None:
+    """Load the pack and every loose entry, stacking their embeddings into one matrix."""
+    positions, entries, embeddings = {}, [], []
+
+    def add(key: str, entry: Dict[str, Any], embedding) -> None:
+        if key in positions:
+            entries[positions[key]] = entry
+            embeddings[positions[key]] = embedding
+        else:
+            positions[key] = len(entries)
+            entries.append(entry)
+            embeddings.append(embedding)
+
+    pack_path = os.path.join(CACHE_DIR, PACK_FILE)
+    if os.path.exists(pack_path):
+        pack_entries, pack_matrix = _read_pack(pack_path)
+        for entry, embedding in zip(pack_entries, pack_matrix):
+            add(_hash_key(entry['prompt']), entry, embedding)
+
+    # Loose files are newer than the pack, so they win on conflicts
+    for filename in _loose_files():
+        with open(os.path.join(CACHE_DIR, filename)) as f:
+            cached_data = json.load(f)
+        embedding = cached_data.pop('embedding', None)
+        if embedding is None:
+            embedding = _compute_embedding(cached_data['prompt'])
+        add(filename[:-len('.json')], cached_data, embedding)
+
+    _index["keys"] = list(positions)
+    _index["positions"] = positions
+    _index["entries"] = entries
+    _index["matrix"] = _normalize(np.asarray(embeddings, dtype=np.float32)) if embeddings else None
+    _index["signature"] = _cache_signature()
+
+def _get_index() -> Dict[str, Any]:
+    if _index["signature"] != _cache_signature():
+        _rebuild_index()
+    return _index
+
+def _add_to_index(key: str, cache_data: Dict[str, Any]) -> None:
+    """Keep the in-memory index in step with a freshly written entry."""
+    if _index["signature"] is None:
+        return  # Not built yet, the next search will load it from disk
+
+    entry = {k: v for k, v in cache_data.items() if k != "embedding"}
+    row = _normalize(np.asarray([cache_data["embedding"]], dtype=np.float32))
+    if key in _index["positions"]:
+        position = _index["positions"][key]
+        _index["entries"][position] = entry
+        _index["matrix"][position] = row[0]
+    else:
+        _index["positions"][key] = len(_index["keys"])
+        _index["keys"].append(key)
+        _index["entries"].append(entry)
+        _index["matrix"] = row if _index["matrix"] is None else np.vstack([_index["matrix"], row])
+    _index["signature"] = _cache_signature()
+
+def find_similar(embedding: np.ndarray, threshold: float = SIMILARITY_THRESHOLD) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached entry most similar to the given embedding.
+    
+    Args:
+        embedding: Embedding of the prompt to look up
+        threshold: Minimum cosine similarity for a match
+        
+    Returns:
+        The best matching cache entry, or None if nothing clears the threshold
+    """
+    with _index_lock:
+        index = _get_index()
+        if index["matrix"] is None:
+            return None
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        similarities = index["matrix"] @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            return None
+        return index["entries"][best]
+
+def load_response(prompt: str, use_semantic_search: bool = True,
+                  embedding: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
     """
     Load response from cache, optionally using semantic search.
     
     Args:
         prompt: The input prompt
         use_semantic_search: Whether to use semantic search for finding similar prompts
+        embedding: Embedding of the prompt, if already computed (e.g. in a batch)
         
     Returns:
         Dictionary containing response and metadata if found, None otherwise
@@ -43,28 +174,17 @@ def load_response(prompt: str, use_semantic_search: bool = True) -> Optional[Dic
         with open(path) as f:
             return json.load(f)
 
+    # Entries that were compacted or imported live in the pack
+    with _index_lock:
+        index = _get_index()
+        if key in index["positions"]:
+            return index["entries"][index["positions"][key]]
+
     if not use_semantic_search:
         return None
 
     # Try semantic search
-    prompt_embedding = _compute_embedding(prompt)
-    best_match = None
-    best_similarity = 0
-
-    for filename in os.listdir(CACHE_DIR):
-        if not filename.endswith('.json'):
-            continue
-            
-        with open(os.path.join(CACHE_DIR, filename)) as f:
-            cached_data = json.load(f)
-            cached_embedding = _compute_embedding(cached_data['prompt'])
-            similarity = _compute_similarity(prompt_embedding, cached_embedding)
-            
-            if similarity > best_similarity and similarity >= SIMILARITY_THRESHOLD:
-                best_similarity = similarity
-                best_match = cached_data
-
-    return best_match
+    return find_similar(_compute_embedding(prompt) if embedding is None else embedding)
 
 def save_response(prompt: str, response: str, metadata: Optional[Dict[str, Any]] = None) -> None:
     """
@@ -84,15 +204,20 @@ def save_response(prompt: str, response: str, metadata: Optional[Dict[str, Any]]
         "metadata": metadata or {}
     }
     
-    with open(os.path.join(CACHE_DIR, f"{key}.json"), "w") as f:
-        print(f"🔁 Saving response to cache: {prompt[:50]}...")
-        json.dump(cache_data, f)
+    with _index_lock:
+        with open(os.path.join(CACHE_DIR, f"{key}.json"), "w") as f:
+            print(f"🔁 Saving response to cache: {prompt[:50]}...")
+            json.dump(cache_data, f)
+        _add_to_index(key, cache_data)
 
 def clear_cache() -> None:
     """Clear all cached responses."""
-    for filename in os.listdir(CACHE_DIR):
-        if filename.endswith('.json'):
-            os.remove(os.path.join(CACHE_DIR, filename))
+    with _index_lock:
+        for filename in _loose_files() + [PACK_FILE]:
+            path = os.path.join(CACHE_DIR, filename)
+            if os.path.exists(path):
+                os.remove(path)
+        _index["signature"] = None
 
 def get_cache_stats() -> Dict[str, Any]:
     """Get statistics about the cache."""
@@ -103,21 +228,123 @@ def get_cache_stats() -> Dict[str, Any]:
         "newest_entry": None
     }
     
-    for filename in os.listdir(CACHE_DIR):
-        if not filename.endswith('.json'):
-            continue
-            
-        path = os.path.join(CACHE_DIR, filename)
-        stats["total_entries"] += 1
-        stats["total_size_bytes"] += os.path.getsize(path)
-        
-        with open(path) as f:
-            data = json.load(f)
-            timestamp = datetime.fromisoformat(data["timestamp"])
-            
-            if stats["oldest_entry"] is None or timestamp < datetime.fromisoformat(stats["oldest_entry"]):
-                stats["oldest_entry"] = data["timestamp"]
-            if stats["newest_entry"] is None or timestamp > datetime.fromisoformat(stats["newest_entry"]):
-                stats["newest_entry"] = data["timestamp"]
+    with _index_lock:
+        index = _get_index()
+        timestamps = [entry["timestamp"] for entry in index["entries"]]
+        for filename in _loose_files() + [PACK_FILE]:
+            path = os.path.join(CACHE_DIR, filename)
+            if os.path.exists(path):
+                stats["total_size_bytes"] += os.path.getsize(path)
+
+    stats["total_entries"] = len(timestamps)
+    if timestamps:
+        stats["oldest_entry"] = min(timestamps, key=datetime.fromisoformat)
+        stats["newest_entry"] = max(timestamps, key=datetime.fromisoformat)
     
     return stats
+
+def _replace_storage(entries: List[Dict[str, Any]], matrix: Optional[np.ndarray]) -> None:
+    """Rewrite the whole cache as a single pack, dropping the loose files. Caller holds the lock."""
+    _write_pack(os.path.join(CACHE_DIR, PACK_FILE), entries, matrix)
+    for filename in _loose_files():
+        os.remove(os.path.join(CACHE_DIR, filename))
+    _index["signature"] = None
+
+def export_cache(path: str) -> int:
+    """
+    Export the whole cache, embedding matrix included, as one compressed archive.
+    
+    Args:
+        path: Destination file (a NumPy .npz archive)
+        
+    Returns:
+        Number of exported entries
+    """
+    with _index_lock:
+        index = _get_index()
+        _write_pack(path, index["entries"], index["matrix"])
+        return len(index["entries"])
+
+def import_cache(path: str, overwrite: bool = False) -> int:
+    """
+    Merge an archive produced by export_cache into this cache.
+    
+    The merged cache is rewritten densely as a single pack.
+    
+    Args:
+        path: Archive to import
+        overwrite: Whether archived entries replace local entries for the same prompt
+        
+    Returns:
+        Number of entries added or replaced
+    """
+    archive_entries, archive_matrix = _read_pack(path)
+    with _index_lock:
+        index = _get_index()
+        entries = list(index["entries"])
+        rows = list(index["matrix"]) if index["matrix"] is not None else []
+        if archive_entries and rows and archive_matrix.shape[1] != len(rows[0]):
+            raise ValueError(
+                f"Archive embedding size {archive_matrix.shape[1]} does not match the cache ({len(rows[0])})"
+            )
+
+        positions = dict(index["positions"])
+        imported = 0
+        for entry, embedding in zip(archive_entries, _normalize(archive_matrix)):
+            key = _hash_key(entry["prompt"])
+            if key in positions:
+                if not overwrite:
+                    continue
+                entries[positions[key]] = entry
+                rows[positions[key]] = embedding
+            else:
+                positions[key] = len(entries)
+                entries.append(entry)
+                rows.append(embedding)
+            imported += 1
+
+        _replace_storage(entries, np.asarray(rows, dtype=np.float32) if rows else None)
+        return imported
+
+def compact_cache(epsilon: float = COMPACTION_EPSILON) -> Dict[str, int]:
+    """
+    Drop near-duplicate entries and rewrite the cache densely as a single pack.
+    
+    Entries whose embeddings are within `epsilon` cosine distance of a newer
+    entry are removed, so the most recent response for a concept is kept.
+    
+    Args:
+        epsilon: Maximum cosine distance for two entries to count as duplicates
+        
+    Returns:
+        Dictionary with entry counts and storage size before and after
+    """
+    with _index_lock:
+        index = _get_index()
+        size_before = sum(
+            os.path.getsize(os.path.join(CACHE_DIR, f))
+            for f in _loose_files() + [PACK_FILE]
+            if os.path.exists(os.path.join(CACHE_DIR, f))
+        )
+        entries, matrix = index["entries"], index["matrix"]
+
+        kept = []
+        if matrix is not None:
+            order = sorted(range(len(entries)), key=lambda i: entries[i]["timestamp"], reverse=True)
+            kept_rows = np.empty_like(matrix)
+            for i in order:
+                if kept and float(np.max(kept_rows[:len(kept)] @ matrix[i])) >= 1.0 - epsilon:
+                    continue
+                kept_rows[len(kept)] = matrix[i]
+                kept.append(i)
+            kept.sort()
+
+        _replace_storage([entries[i] for i in kept], matrix[kept] if kept else None)
+        size_after = os.path.getsize(os.path.join(CACHE_DIR, PACK_FILE))
+
+    return {
+        "entries_before": len(entries),
+        "entries_after": len(kept),
+        "size_before_bytes": size_before,
+        "size_after_bytes": size_after
+    }
@@ -0,0 +1,56 @@
+"""
+ELI5 Tutor Cache Tools
+
+Command line maintenance for the prompt cache.
+
+Usage:
+    python cache_tools.py export warm_cache.npz
+    python cache_tools.py import warm_cache.npz [--overwrite]
+    python cache_tools.py compact [--epsilon 0.02]
+    python cache_tools.py stats
+"""
+
+import argparse
+
+from cache.prompt_cache import COMPACTION_EPSILON, compact_cache, export_cache, get_cache_stats, import_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, import and compact the ELI5 prompt cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write the cache to a single compressed archive")
+    export_parser.add_argument("archive", help="Destination .npz file")
+
+    import_parser = commands.add_parser("import", help="Merge an exported archive into the cache")
+    import_parser.add_argument("archive", help="Archive produced by the export command")
+    import_parser.add_argument("--overwrite", action="store_true", help="Replace local entries for the same prompt")
+
+    compact_parser = commands.add_parser("compact", help="Drop near-duplicates and rewrite the cache densely")
+    compact_parser.add_argument("--epsilon", type=float, default=COMPACTION_EPSILON,
+                                help="Maximum cosine distance for two entries to count as duplicates")
+
+    commands.add_parser("stats", help="Show cache statistics")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        count = export_cache(args.archive)
+        print(f"📦 Exported {count} entries to {args.archive}")
+    elif args.command == "import":
+        count = import_cache(args.archive, overwrite=args.overwrite)
+        print(f"📥 Imported {count} entries from {args.archive}")
+    elif args.command == "compact":
+        result = compact_cache(args.epsilon)
+        print(f"🧹 Compacted {result['entries_before']} entries into {result['entries_after']}")
+        print(f"Size: {result['size_before_bytes'] / 1024:.1f} KB -> {result['size_after_bytes'] / 1024:.1f} KB")
+    else:
+        stats = get_cache_stats()
+        print(f"Total entries: {stats['total_entries']}")
+        print(f"Total size: {stats['total_size_bytes'] / 1024:.2f} KB")
+        print(f"Oldest entry: {stats['oldest_entry']}")
+        print(f"Newest entry: {stats['newest_entry']}")
+
+
+if __name__ == "__main__":
+    main()
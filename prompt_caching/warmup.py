@@ -0,0 +1,214 @@
+"""
+ELI5 Tutor Cache Warm-up
+
+Batch entry point that pre-populates the prompt cache from a file of concepts
+(one per line, or a JSON list of strings) before the tutor goes live.
+
+Prompts are deduplicated against the cache and against each other, by exact
+and by semantic match. Only the misses are sent through the ELI5 agent, using
+a bounded thread pool and a global rate limit. Every finished prompt is
+appended to a checkpoint file (near-duplicates once the prompt they duplicate
+has been generated), so an interrupted run picks up where it left off.
+
+Usage:
+    python warmup.py faq.txt --workers 4 --rate 2
+    python warmup.py faq.txt --stub   # offline rehearsal, no LLM calls
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Set
+
+import numpy as np
+from agents.eli5_agent import ELI5Agent
+from cache.prompt_cache import SIMILARITY_THRESHOLD, _hash_key, load_response, model
+
+CHECKPOINT_PATH = "./cache/warmup_checkpoint.jsonl"
+
+
+class StubELI5Agent(ELI5Agent):
+    """ELI5 agent that answers locally, for running warm-ups offline."""
+
+    def __init__(self, latency: float = 0.0):
+        self.model = "stub"
+        self.temperature = 0.0
+        self.api_key = None
+        self.cache_enabled = True
+        self.latency = latency
+
+    def _generate(self, user_prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return f"Imagine {user_prompt.strip()} is like a toy you can take apart to see how it works."
+
+
+class RateLimiter:
+    """Spaces out calls so that at most `rate` of them start per second, across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+
+def read_prompts(path: str) -> List[str]:
+    """Read prompts from a JSON list or a plain text file (one per line, '#' for comments)."""
+    with open(path) as f:
+        if path.endswith(".json"):
+            return [str(prompt).strip() for prompt in json.load(f) if str(prompt).strip()]
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Return the keys of prompts a previous run already finished."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written line from an interrupted run
+            if entry.get("status") != "failed":
+                done.add(entry["key"])
+    return done
+
+
+def _dedupe_semantically(prompts: List[str], embeddings: np.ndarray) -> tuple[List[str], Dict[str, str]]:
+    """Split prompts into ones to generate and near-duplicates, mapped to the earlier prompt they duplicate."""
+    kept, duplicates, kept_rows = [], {}, []
+    for prompt, embedding in zip(prompts, embeddings):
+        if kept_rows:
+            similarities = np.asarray(kept_rows) @ embedding
+            best = int(np.argmax(similarities))
+            if float(similarities[best]) >= SIMILARITY_THRESHOLD:
+                duplicates[prompt] = kept[best]
+                continue
+        kept.append(prompt)
+        kept_rows.append(embedding)
+    return kept, duplicates
+
+
+def warm_up(agent: ELI5Agent, prompts: List[str], workers: int = 4, rate: float = 2.0,
+            checkpoint_path: str = CHECKPOINT_PATH) -> Dict[str, int]:
+    """
+    Pre-populate the cache with explanations for the given prompts.
+
+    Args:
+        agent: Agent used to generate explanations for cache misses
+        prompts: Concepts or questions to warm the cache with
+        workers: Maximum number of concurrent LLM calls
+        rate: Maximum number of LLM calls started per second (0 disables the limit)
+        checkpoint_path: File recording finished prompts, used to resume
+
+    Returns:
+        dict: Counts of prompts per outcome
+    """
+    stats = {"total": len(prompts), "resumed": 0, "duplicate": 0, "cached": 0, "generated": 0, "failed": 0}
+    done = load_checkpoint(checkpoint_path)
+    checkpoint_lock = threading.Lock()
+
+    def record(prompt: str, status: str) -> None:
+        stats[status] += 1
+        with checkpoint_lock, open(checkpoint_path, "a") as f:
+            f.write(json.dumps({
+                "key": _hash_key(prompt),
+                "prompt": prompt,
+                "status": status,
+                "timestamp": datetime.now().isoformat()
+            }) + "\n")
+
+    # Exact duplicates within the file and prompts finished by an earlier run
+    pending, seen = [], set()
+    for prompt in prompts:
+        key = _hash_key(prompt)
+        if key in done:
+            stats["resumed"] += 1
+        elif key in seen:
+            stats["duplicate"] += 1
+        else:
+            pending.append(prompt)
+        seen.add(key)
+
+    # Exact and semantic matches against what is already cached, embedding the whole batch once
+    embeddings = model.encode(pending, normalize_embeddings=True) if pending else []
+    misses, miss_embeddings = [], []
+    for prompt, embedding in zip(pending, embeddings):
+        if load_response(prompt, embedding=embedding):
+            record(prompt, "cached")
+        else:
+            misses.append(prompt)
+            miss_embeddings.append(embedding)
+
+    # Near-duplicates within the batch would be answered by the same cache entry, so they
+    # are only checkpointed once the prompt they duplicate has been generated
+    misses, duplicates = _dedupe_semantically(misses, miss_embeddings)
+    duplicates_of: Dict[str, List[str]] = {}
+    for prompt, representative in duplicates.items():
+        duplicates_of.setdefault(representative, []).append(prompt)
+
+    print(f"🔥 Warming cache: {len(misses)} to generate, {stats['total'] - len(misses) - len(duplicates)} skipped, "
+          f"{len(duplicates)} near-duplicates")
+
+    limiter = RateLimiter(rate)
+
+    def process(prompt: str) -> dict:
+        limiter.wait()
+        _, metadata = agent.explain(prompt)
+        return metadata
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(process, prompt): prompt for prompt in misses}
+        for i, future in enumerate(as_completed(futures), 1):
+            prompt = futures[future]
+            try:
+                metadata = future.result()
+                record(prompt, "cached" if metadata["cached"] else "generated")
+                for duplicate in duplicates_of.get(prompt, []):
+                    record(duplicate, "duplicate")
+                print(f"[{i}/{len(misses)}] ✅ {prompt[:50]}")
+            except Exception as e:
+                # Its near-duplicates are left for the next run too
+                for failed in [prompt] + duplicates_of.get(prompt, []):
+                    record(failed, "failed")
+                print(f"[{i}/{len(misses)}] ❌ {prompt[:50]}: {str(e)}")
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-populate the ELI5 prompt cache from a file of prompts.")
+    parser.add_argument("prompts_file", help="Text file with one prompt per line, or a JSON list of prompts")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum concurrent LLM calls")
+    parser.add_argument("--rate", type=float, default=2.0, help="Maximum LLM calls started per second (0 = unlimited)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint file used to resume interrupted runs")
+    parser.add_argument("--stub", action="store_true", help="Use a local stub instead of the LLM (offline)")
+    args = parser.parse_args()
+
+    agent = StubELI5Agent() if args.stub else ELI5Agent()
+    agent.cache_enabled = True
+
+    stats = warm_up(agent, read_prompts(args.prompts_file), args.workers, args.rate, args.checkpoint)
+
+    print("\n📊 Warm-up Summary:")
+    for name, count in stats.items():
+        print(f"{name.capitalize()}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
 # app.py
 import os
+import re
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import numpy as np
+import pandas as pd
 import streamlit as st
+from cachetools import LRUCache, TTLCache
+from sentence_transformers import SentenceTransformer
+from sqlalchemy import MetaData, create_engine, event, text
+from sqlalchemy.engine import make_url
 from langchain_community.utilities import SQLDatabase
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 
@@ -19,28 +29,329 @@ load_dotenv()
 # Initialize database connection using environment variables
 db_uri = os.getenv("DB_URI")
 
-db = SQLDatabase.from_uri(db_uri)
+# Size of the connection pool, and of the worker pool that runs queries on it
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+# Longest a single statement may run, in seconds
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "15"))
 
-# Initialize Groq LLM with environment variable
-groq_api_key = os.getenv("GROQ_API_KEY")
-llm = ChatGroq(
-    temperature=0,
-    groq_api_key=groq_api_key,
-    model_name="llama-3.3-70b-versatile"
-)
+def _install_statement_timeout(engine):
+    """Make the database itself abort statements running longer than QUERY_TIMEOUT."""
+    dialect = engine.dialect.name
+    timeout_ms = int(QUERY_TIMEOUT * 1000)
+
+    @event.listens_for(engine, "connect")
+    def _set_statement_timeout(dbapi_connection, connection_record):
+        if dialect == "postgresql":
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET statement_timeout = {timeout_ms}")
+            cursor.close()
+        elif dialect in ("mysql", "mariadb"):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {timeout_ms}")
+            cursor.close()
+        elif dialect == "sqlite":
+            # SQLite has no statement timeout: interrupt from its progress handler instead
+            dbapi_connection.set_progress_handler(
+                lambda: int(time.monotonic() > connection_record.info.get("deadline", float("inf"))), 10000
+            )
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_statement_clock(conn, cursor, statement, parameters, context, executemany):
+        conn.info["deadline"] = time.monotonic() + QUERY_TIMEOUT
+
+# Streamlit re-executes this script on every message, so everything expensive to build is
+# created once per process and shared by all sessions through st.cache_resource.
+@st.cache_resource
+def get_database():
+    """
+    Create the pooled engine and reflect the schema once per process.
+    
+    The engine and the reflected metadata are kept so queries run on the engine
+    directly (results come back as tables) and tables can be matched without
+    extra DB round trips.
+    """
+    engine_options = {"pool_pre_ping": True}
+    if make_url(db_uri).get_backend_name() != "sqlite":
+        engine_options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_SIZE, pool_recycle=1800)
+    engine = create_engine(db_uri, **engine_options)
+    _install_statement_timeout(engine)
+    metadata = MetaData()
+    db = SQLDatabase(engine, metadata=metadata)
+    return engine, metadata, db
+
+@st.cache_resource
+def get_llm():
+    """Initialize Groq LLM with environment variable"""
+    return ChatGroq(
+        temperature=0,
+        groq_api_key=os.getenv("GROQ_API_KEY"),
+        model_name="llama-3.3-70b-versatile"
+    )
+
+engine, metadata, db = get_database()
+
+# Maximum number of tables put into the prompt for a single question
+MAX_PROMPT_TABLES = int(os.getenv("MAX_PROMPT_TABLES", "5"))
+# Minimum similarity for a new question to reuse the SQL generated for an earlier one
+SQL_CACHE_SIMILARITY = float(os.getenv("SQL_CACHE_SIMILARITY", "0.92"))
+# How long query results are reused, in seconds
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "60"))
+# Number of result rows previewed in the chat while the answer is written
+RESULT_PREVIEW_ROWS = 20
+# Maximum number of rows fetched for a generated query
+MAX_QUERY_ROWS = int(os.getenv("MAX_QUERY_ROWS", "1000"))
+# Rows counted at most to report the size of a truncated result
+MAX_COUNTED_ROWS = int(os.getenv("MAX_COUNTED_ROWS", "100000"))
+# Maximum number of rows put into the answer prompt; larger results are summarised
+PROMPT_SAMPLE_ROWS = int(os.getenv("PROMPT_SAMPLE_ROWS", "50"))
+
+class SchemaCache:
+    """Per-session cache of table info (CREATE statement plus sample rows) keyed by table, for one database."""
+
+    def __init__(self, db):
+        self.db = db
+        self._table_info = {}
+
+    def get_table_info(self, table_names):
+        """Return the table info for the given tables, introspecting only the ones not seen yet."""
+        for table in table_names:
+            if table not in self._table_info:
+                self._table_info[table] = self.db.get_table_info([table])
+        return "\n\n".join(self._table_info[table] for table in table_names)
+
+    def clear(self):
+        """Forget all cached table info, e.g. after the schema changed."""
+        self._table_info = {}
+
+def _tokens(text):
+    """Lower-case word stems used for keyword matching between questions and tables."""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return {word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words}
+
+def select_tables(question):
+    """Pick the tables relevant to the question by matching keywords against table and column names."""
+    question_tokens = _tokens(question)
+    usable_tables = db.get_usable_table_names()
+    scores = {}
+    for table in usable_tables:
+        columns = metadata.tables[table].columns if table in metadata.tables else []
+        score = 3 * len(question_tokens & _tokens(table.replace("_", " ")))
+        score += sum(1 for column in columns if _tokens(column.name.replace("_", " ")) & question_tokens)
+        if score:
+            scores[table] = score
+
+    # Nothing recognisable in the question: fall back to the full schema
+    if not scores:
+        return list(usable_tables)
+
+    selected = sorted(scores, key=scores.get, reverse=True)[:MAX_PROMPT_TABLES]
+
+    # Pull in tables referenced by foreign keys so the model can write the joins
+    for table in list(selected):
+        if table in metadata.tables:
+            for foreign_key in metadata.tables[table].foreign_keys:
+                referred = foreign_key.column.table.name
+                if referred in usable_tables and referred not in selected:
+                    selected.append(referred)
+    return selected
+
+# Table info is cached per chat session for the current database resource; a session
+# whose cache was built for an earlier one (the schema was refreshed) starts afresh
+if "schema_cache" not in st.session_state or st.session_state.schema_cache.db is not db:
+    st.session_state.schema_cache = SchemaCache(db)
+schema_cache = st.session_state.schema_cache
+
+# Get schema of the relevant tables
+def get_schema(x):
+    """Retrieve schema information for the tables relevant to the question."""
+    return schema_cache.get_table_info(select_tables(x["question"]))
+
+def _normalize_question(question):
+    return " ".join(question.lower().strip().rstrip("?.!").split())
+
+def _literals(question):
+    """Numbers, quoted strings and capitalised names, which must match for a semantic hit."""
+    quoted = re.findall(r"(?:^|\s)['\"]([^'\"]+)['\"]", question)
+    numbers = re.findall(r"\d+(?:\.\d+)?", question)
+    names = [word.strip(",.?!") for word in question.split()[1:] if len(word) > 1 and word[0].isupper()]
+    return set(quoted) | set(numbers) | set(names)
+
+class SQLCache:
+    """Question -> SQL cache with exact and semantic matching, shared by all sessions."""
+
+    def __init__(self, embedding_model, threshold, maxsize=500):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self._entries = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def lookup(self, question):
+        """Return (query, "exact" or "semantic") for a cached question, or None."""
+        key = _normalize_question(question)
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]["query"], "exact"
+            entries = list(self._entries.values())
+        if not entries:
+            return None
+
+        embedding = self.embedding_model.encode(key, normalize_embeddings=True)
+        similarities = np.stack([entry["embedding"] for entry in entries]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.threshold and entries[best]["literals"] == _literals(question):
+            return entries[best]["query"], "semantic"
+        return None
+
+    def add(self, question, query):
+        key = _normalize_question(question)
+        entry = {
+            "query": query,
+            "embedding": self.embedding_model.encode(key, normalize_embeddings=True),
+            "literals": _literals(question),
+        }
+        with self._lock:
+            self._entries[key] = entry
+
+    def discard(self, question):
+        with self._lock:
+            self._entries.pop(_normalize_question(question), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class ResultCache:
+    """Short-lived SQL -> result cache, so repeated dashboard queries skip the database."""
+
+    def __init__(self, ttl, maxsize=256):
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
 
-# Get schema of the database
-def get_schema(_):
-    """Retrieve schema information for all tables in the database."""
-    return db.get_table_info()
+    def get(self, query):
+        with self._lock:
+            return self._results.get(query.strip())
+
+    def set(self, query, result):
+        with self._lock:
+            self._results[query.strip()] = result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+@st.cache_resource
+def load_embedding_model():
+    """Load the sentence embedding model once per process."""
+    return SentenceTransformer("all-MiniLM-L6-v2")
+
+@st.cache_resource
+def get_query_caches():
+    """Create the SQL and result caches shared by every chat session."""
+    return SQLCache(load_embedding_model(), SQL_CACHE_SIMILARITY), ResultCache(RESULT_CACHE_TTL)
+
+sql_cache, result_cache = get_query_caches()
+
+# Dialects that understand a trailing LIMIT clause
+LIMIT_DIALECTS = {"sqlite", "mysql", "mariadb", "postgresql", "duckdb"}
+
+def limit_query(query, max_rows):
+    """Append a LIMIT to a single SELECT that has none, so the database stops after max_rows + 1 rows."""
+    statement = query.strip().rstrip(";").strip()
+    if engine.dialect.name not in LIMIT_DIALECTS or ";" in statement:
+        return statement
+    if not re.match(r"(?is)^(select|with)\b", statement):
+        return statement
+    if re.search(r"(?is)\blimit\s+\d+(\s*(,|offset)\s*\d+)?$", statement):
+        return statement
+    # On its own line, so a trailing -- comment cannot swallow it
+    return f"{statement}\nLIMIT {max_rows + 1}"
+
+def _count_rows(connection, query):
+    """
+    Count the rows a query would return without fetching them, stopping at
+    MAX_COUNTED_ROWS + 1; None if the database refuses.
+    """
+    statement = query.strip().rstrip(";")
+    if engine.dialect.name not in LIMIT_DIALECTS:
+        return None
+    try:
+        return connection.execute(text(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM ({statement}) AS counted_rows LIMIT {MAX_COUNTED_ROWS + 1}) AS capped_rows"
+        )).scalar()
+    except Exception:
+        return None
 
 # Execute SQL query
 def run_query(query):
-    """Run a SQL query and return the results."""
+    """
+    Run a SQL query and return the result together with the result cache status.
+    
+    The result holds at most MAX_QUERY_ROWS rows in "table"; "row_count" is the
+    full size of the result (None if it could not be counted, above
+    MAX_COUNTED_ROWS if there are more than that) and "truncated" tells whether
+    rows were left out.
+    """
+    cached = result_cache.get(query)
+    if cached is not None:
+        return cached, "hit"
     try:
-        return db.run(query)
+        with engine.connect() as connection:
+            cursor = connection.execute(text(limit_query(query, MAX_QUERY_ROWS)))
+            if cursor.returns_rows:
+                columns = list(cursor.keys())
+                rows = cursor.fetchmany(MAX_QUERY_ROWS + 1)
+                cursor.close()
+            else:
+                columns, rows = [], []
+            truncated = len(rows) > MAX_QUERY_ROWS
+            row_count = _count_rows(connection, query) if truncated else len(rows)
+            # Keep any changes the statement made, as SQLDatabase.run did
+            connection.commit()
     except Exception as e:
-        return f"Error executing query: {str(e)}"
+        return f"Error executing query: {str(e)}", "error"
+    result = {
+        "table": pd.DataFrame(rows[:MAX_QUERY_ROWS], columns=columns),
+        "row_count": row_count,
+        "truncated": truncated,
+    }
+    # Statements without rows changed the database, so running them again must not be skipped
+    if columns:
+        result_cache.set(query, result)
+    return result, "miss"
+
+@st.cache_resource
+def get_query_executor():
+    """Worker threads for queries, sized to the connection pool and shared by every session."""
+    return ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="sql-query")
+
+async def arun_query(query):
+    """Run a SQL query on the query workers, giving up once it exceeds QUERY_TIMEOUT."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(get_query_executor(), run_query, query), timeout=QUERY_TIMEOUT + 1
+        )
+    except asyncio.TimeoutError:
+        return f"Error executing query: timed out after {QUERY_TIMEOUT:g} seconds", "error"
+
+def describe_row_count(result):
+    if result["row_count"] is None:
+        return f"more than {len(result['table'])} rows"
+    if result["row_count"] > MAX_COUNTED_ROWS:
+        return f"more than {MAX_COUNTED_ROWS} rows"
+    return f"{result['row_count']} rows"
+
+def format_result(result):
+    """Render a query result for the answer prompt, summarising large results."""
+    if isinstance(result, str):
+        return result
+    sample = result["table"].head(PROMPT_SAMPLE_ROWS)
+    if not result["truncated"] and len(sample) == len(result["table"]):
+        return sample.to_csv(index=False)
+    return (
+        f"The query returned {describe_row_count(result)}; the first {len(sample)} are shown.\n"
+        + sample.to_csv(index=False)
+    )
 
 # Template for generating SQL queries
 template_sql_query = """Based on the table schema below, write a SQL query that would answer the user's question:
@@ -52,13 +363,6 @@ Do not enclose query in ```sql and do not write preamble or explanation.
 You MUST return only a single SQL query."""
 prompt_sql_query = ChatPromptTemplate.from_template(template_sql_query)
 
-# Chain to generate SQL queries
-sql_chain = (
-    RunnablePassthrough.assign(schema=get_schema)  # Pass schema to prompt
-    | prompt_sql_query
-    | llm
-    | StrOutputParser()  # Parse LLM output to string
-)
 
 # Template for generating final response
 template_final = """Based on the table schema below, question, SQL query, and SQL response, write a natural language response:
@@ -70,22 +374,83 @@ SQL Response: {response}
 """
 prompt_response = ChatPromptTemplate.from_template(template_final)
 
-# Full chain to execute query and generate response
-full_chain = (
-    RunnablePassthrough.assign(query=sql_chain)  # Generate SQL query
-    .assign(
-        schema=get_schema,  # Pass schema
-        response=lambda x: run_query(x["query"]),  # Execute query
+@st.cache_resource
+def get_chains():
+    """Compile the SQL-generation and answer chains once per process."""
+    llm = get_llm()
+
+    # Chain to generate SQL queries (expects schema and question)
+    sql_chain = (
+        prompt_sql_query
+        | llm
+        | StrOutputParser()  # Parse LLM output to string
     )
-    | prompt_response
-    | llm
-    | StrOutputParser()  # Parse final response
-)
+
+    # Chain to turn the question, SQL and result into a natural language answer
+    answer_chain = (
+        prompt_response
+        | llm
+        | StrOutputParser()  # Parse final response
+    )
+    return sql_chain, answer_chain
+
+sql_chain, answer_chain = get_chains()
+
+# The question is answered in explicit stages so the UI can show each one as soon as it is ready:
+# prepare_question -> generate_query -> execute_query (async) -> answer_chain.stream
+def prepare_question(question):
+    """Look up the schema once; it is shared by both prompts."""
+    x = {"question": question}
+    return {**x, "schema": get_schema(x)}
+
+def generate_query(x, on_token=None):
+    """
+    Generate SQL for the question, reusing the query cached for the same or a similar question.
+    
+    on_token is called with the partial query as the model streams it.
+    """
+    cached = sql_cache.lookup(x["question"])
+    if cached:
+        query, status = cached
+        return {**x, "query": query, "sql_cache": status}
+    query = ""
+    for chunk in sql_chain.stream(x):
+        query += chunk
+        if on_token:
+            on_token(query)
+    query = query.strip()
+    sql_cache.add(x["question"], query)
+    return {**x, "query": query, "sql_cache": "miss"}
+
+async def execute_query(x):
+    """Execute the generated SQL, dropping it from the SQL cache if it fails."""
+    result, status = await arun_query(x["query"])
+    if status == "error":
+        sql_cache.discard(x["question"])
+    return {**x, "result": result, "response": format_result(result), "result_cache": status}
+
+def cache_status(result):
+    """Describe which steps were served from cache."""
+    sql_status = {
+        "exact": "⚡ SQL from cache",
+        "semantic": "⚡ SQL from cache (similar question)",
+    }.get(result["sql_cache"], "🤖 SQL generated")
+    result_status = "💾 result from cache" if result["result_cache"] == "hit" else "🗄️ result from database"
+    return f"{sql_status} · {result_status}"
 
 # Streamlit UI
 st.title("Chat with SQL 🧊")
 st.write("Ask questions about your database!")
 
+with st.sidebar:
+    if st.button("🔄 Refresh schema"):
+        # Re-reflect the database for every session; each session's table info goes with the old one
+        engine.dispose()
+        get_database.clear()
+        sql_cache.clear()
+        result_cache.clear()
+        st.rerun()
+
 # Chat input
 prompt = st.chat_input("What would you like to know?")
 
@@ -93,11 +458,25 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Generate and display response
+    # Generate and display response, stage by stage
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                response = full_chain.invoke({"question": prompt})
-                st.write(response)
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
\ No newline at end of file
+        try:
+            with st.spinner("Reading schema..."):
+                state = prepare_question(prompt)
+
+            sql_placeholder = st.empty()
+            state = generate_query(state, on_token=lambda partial: sql_placeholder.code(partial, language="sql"))
+            sql_placeholder.code(state["query"], language="sql")
+
+            with st.spinner("Running query..."):
+                state = asyncio.run(execute_query(state))
+            if state["result_cache"] == "error":
+                st.error(state["response"])
+            else:
+                st.dataframe(state["result"]["table"].head(RESULT_PREVIEW_ROWS), hide_index=True)
+                st.caption(describe_row_count(state["result"]))
+
+            st.write_stream(answer_chain.stream(state))
+            st.caption(cache_status(state))
+        except Exception as e:
+            st.error(f"An error occurred: {str(e)}")
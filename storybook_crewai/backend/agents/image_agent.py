@@ -5,13 +5,17 @@ import sys
 from dotenv import load_dotenv
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from backend.models import StoryOutput, StoryPage
+from backend.rate_limiter import AsyncRateLimiter
+from backend.asset_cache import AssetCache, asset_key
+import base64
 import json
 import requests
+from openai import AsyncOpenAI
 from PIL import Image
 from io import BytesIO
 import asyncio
@@ -20,17 +24,46 @@ from concurrent.futures import ThreadPoolExecutor
 # Load environment variables
 load_dotenv()
 
+# Called with (page, image_path, error) as each page finishes
+PageProgressCallback = Callable[[StoryPage, Optional[str], Optional[Exception]], None]
+
+# Style the illustrator agent asks for; the direct backend adds it to the story writer's image prompt
+ILLUSTRATION_STYLE = ("Colorful, cartoonish children's book illustration with a positive, engaging mood, clear details "
+                      "that are easy to understand, expressive and friendly characters, and bright, vibrant colors.")
+
+# image_quality uses the DALL-E names; gpt-image models take their own quality levels
+GPT_IMAGE_QUALITY = {"standard": "medium", "hd": "high"}
+
 class ImageGenerationAgent:
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None, requests_per_minute: Optional[float] = None):
         self.model = os.getenv("IMAGE_MODEL", "dall-e-3")
+        # "direct" calls the image API with the page's prompt; "agent" has a GPT-4 illustrator refine it first
+        self.backend = os.getenv("IMAGE_BACKEND", "direct")
+        self.image_size = "1024x1024"
+        self.image_quality = "standard"
         self.temperature = float(os.getenv("AGENT_TEMPERATURE", "0.7"))
         self.api_key = os.getenv("OPENAI_API_KEY")
        
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
+        if self.backend == "direct" and not self.model.startswith(("dall-e", "gpt-image")):
+            raise ValueError(f"IMAGE_MODEL '{self.model}' is not supported by the direct image backend, "
+                             "use a dall-e-* or gpt-image-* model")
         
-        self.image_agent = self.__createAgent()
-        self.executor = ThreadPoolExecutor(max_workers=3)  # Limit concurrent image generations
+        # Pages generated at the same time, and image requests started per minute (0 = no limit)
+        self.max_concurrency = max_concurrency or int(os.getenv("IMAGE_CONCURRENCY", "3"))
+        if requests_per_minute is None:
+            requests_per_minute = float(os.getenv("IMAGE_REQUESTS_PER_MINUTE", "0"))
+        self.rate_limiter = AsyncRateLimiter(requests_per_minute)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._caches: Dict[Path, AssetCache] = {}
+
+        # Long-lived clients, shared by every page
+        if self.backend == "agent":
+            self.image_agent = self.__createAgent()
+        else:
+            self.client = AsyncOpenAI(api_key=self.api_key)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)  # Limit concurrent image generations
 
     def __createAgent(self) -> Agent:
         llm = LLM(
@@ -41,9 +74,9 @@ class ImageGenerationAgent:
 
         # Configure DALL-E tool with specific parameters
         dalle_tool = DallETool(
-            model="dall-e-3",
-            size="1024x1024",
-            quality="standard",
+            model=self.model,
+            size=self.image_size,
+            quality=self.image_quality,
             n=1
         )
 
@@ -60,6 +93,43 @@ class ImageGenerationAgent:
         )
 
     async def _generate_image(self, prompt: str, output_path: str) -> str:
+        """Generate an image with the configured backend"""
+        if self.backend == "agent":
+            return await self._generate_image_with_agent(prompt, output_path)
+        return await self._generate_image_direct(prompt, output_path)
+
+    async def _generate_image_direct(self, prompt: str, output_path: str) -> str:
+        """Generate an image by calling the image API with the prompt, without an LLM refinement step"""
+        try:
+            response = await self.client.images.generate(
+                model=self.model,
+                prompt=f"{prompt}\n\n{ILLUSTRATION_STYLE}",
+                size=self.image_size,
+                quality=self._api_quality(),
+                n=1,
+                # DALL-E returns a URL to download unless asked for the image itself; gpt-image models always
+                # return the image and reject response_format
+                **({"response_format": "b64_json"} if self.model.startswith("dall-e") else {})
+            )
+            image = response.data[0]
+            loop = asyncio.get_running_loop()
+            if image.b64_json:
+                await loop.run_in_executor(self.executor, self._save_image, base64.b64decode(image.b64_json), output_path)
+            else:
+                await loop.run_in_executor(self.executor, self._download_image, image.url, output_path)
+            
+            return output_path
+            
+        except Exception as e:
+            raise ValueError(f"Failed to generate image: {str(e)}")
+
+    def _api_quality(self) -> str:
+        """The image API's quality value for image_quality with the configured model"""
+        if self.model.startswith("gpt-image"):
+            return GPT_IMAGE_QUALITY.get(self.image_quality, self.image_quality)
+        return self.image_quality
+
+    async def _generate_image_with_agent(self, prompt: str, output_path: str) -> str:
         """Generate an image using CrewAI's DALL-E tool"""
         try:
             # Create a task for refining the prompt and generating the image
@@ -80,18 +150,18 @@ class ImageGenerationAgent:
                 IMPORTANT: Use the DALL-E tool to generate the image and return ONLY the image URL.
                 Do not include any other text or explanation in your response.""",
                 expected_output="The URL of the generated image, nothing else",
-                agent=self.image_agent
+                agent=self.image_agent.copy()  # Crews run concurrently, each needs its own executor state
             )
             
             # Create a crew with just the image agent
             crew = Crew(
-                agents=[self.image_agent],
+                agents=[task.agent],
                 tasks=[task],
                 verbose=True
             )
             
             # Execute the task in a thread pool
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             crew_output = await loop.run_in_executor(
                 self.executor,
                 crew.kickoff
@@ -116,48 +186,96 @@ class ImageGenerationAgent:
             if not image_url.startswith('https://oaidalleapiprodscus.blob.core.windows.net'):
                 raise ValueError(f"Invalid DALL-E URL format: {image_url}")
             
-            # Download the image from the URL
-            response = requests.get(image_url)
-            if response.status_code != 200:
-                raise ValueError(f"Failed to download image: {response.text}")
-            
-            # Save the image
-            image = Image.open(BytesIO(response.content))
-            image.save(output_path)
+            # Download and save the image without blocking the event loop
+            await loop.run_in_executor(self.executor, self._download_image, image_url, output_path)
             
             return output_path
             
         except Exception as e:
             raise ValueError(f"Failed to generate image: {str(e)}")
 
-    async def generate_images(self, story: StoryOutput, output_dir: str) -> List[str]:
-        """Generate images for all pages in the story asynchronously"""
-        # Create output directory if it doesn't exist
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
-        
-        # Create tasks for all images
-        tasks = []
-        for page in story.pages:
-            # Create a unique filename for each page
-            filename = f"page_{page.page_number}_{story.title.lower().replace(' ', '_')}.png"
-            output_path = os.path.join(output_dir, filename)
-            
-            # Create task for this page's image
-            task = self._generate_image(page.image_prompt, output_path)
-            tasks.append(task)
+    def _download_image(self, image_url: str, output_path: str) -> None:
+        """Download the image from the URL and save it"""
+        response = requests.get(image_url)
+        if response.status_code != 200:
+            raise ValueError(f"Failed to download image: {response.text}")
         
-        # Wait for all images to be generated
-        generated_images = []
-        for i, task in enumerate(tasks, 1):
+        self._save_image(response.content, output_path)
+
+    def _save_image(self, image_data: bytes, output_path: str) -> None:
+        """Save image data as a PNG"""
+        image = Image.open(BytesIO(image_data))
+        image.save(output_path, format="PNG")
+
+    async def generate_images(self, story: StoryOutput, output_dir: str,
+                              on_progress: Optional[PageProgressCallback] = None) -> List[str]:
+        """
+        Generate images for all pages in the story concurrently.
+
+        At most max_concurrency pages are generated at once and image requests
+        are spaced out by the rate limiter. Progress is reported per page as
+        pages finish, in completion order. Returns the generated image paths
+        in page order; failed pages are reported and left out.
+
+        Images are stored in output_dir by content address, so a page whose
+        prompt and image settings are unchanged reuses the stored PNG.
+        """
+        async def generate_page(page: StoryPage):
             try:
-                image_path = await task
-                generated_images.append(image_path)
-                print(f"Generated image for page {i}: {image_path}")
+                image_path, reused = await self.generate_page_image(page, output_dir)
+                return page, image_path, None, reused
             except Exception as e:
-                print(f"Error generating image for page {i}: {str(e)}")
+                return page, None, e, False
+
+        # Wait for the images as they are generated
+        generated_images = {}
+        tasks = [asyncio.create_task(generate_page(page)) for page in story.pages]
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            page, image_path, error, reused = await task
+            if error:
+                print(f"[{done}/{len(tasks)}] Error generating image for page {page.page_number}: {str(error)}")
+            else:
+                generated_images[page.page_number] = image_path
+                action = "Reused" if reused else "Generated"
+                print(f"[{done}/{len(tasks)}] {action} image for page {page.page_number}: {image_path}")
+            if on_progress:
+                on_progress(page, image_path, error)
         
-        return generated_images
+        return [generated_images[page.page_number] for page in story.pages if page.page_number in generated_images]
+
+    async def generate_page_image(self, page: StoryPage, output_dir: str) -> Tuple[str, bool]:
+        """
+        Generate the image for one page, for pipelines that handle each page as soon as it exists.
+
+        Returns (image_path, reused). Calls share the agent's concurrency and
+        rate limits, and reuse a stored image when the prompt is unchanged.
+        """
+        output_dir = Path(output_dir)
+        if output_dir not in self._caches:
+            # Content-addressed store in the output directory (created if it doesn't exist)
+            self._caches[output_dir] = AssetCache(output_dir, ".png")
+
+        async def generate(output_path: Path):
+            async with self.semaphore:
+                await self.rate_limiter.wait()
+                await self._generate_image(page.image_prompt, str(output_path))
+
+        image_path, reused = await self._caches[output_dir].get_or_create(self.image_key(page.image_prompt), generate)
+        return str(image_path), reused
+
+    def image_key(self, prompt: str) -> str:
+        """Content address of the image generated for a prompt with the current settings"""
+        return asset_key(kind="image", prompt=prompt, model=self.model, size=self.image_size,
+                         quality=self.image_quality, backend=self.backend,
+                         style=ILLUSTRATION_STYLE if self.backend == "direct" else None)
+
+    async def aclose(self) -> None:
+        """Close the image API connection pool, on the event loop that used it, and the thread pool"""
+        if self.backend != "agent":
+            await self.client.close()
+        self.executor.shutdown(wait=False)
 
     def __del__(self):
         """Clean up the thread pool executor"""
-        self.executor.shutdown(wait=True)
+        if hasattr(self, "executor"):  # Not created when __init__ rejected the configuration
+            self.executor.shutdown(wait=True)
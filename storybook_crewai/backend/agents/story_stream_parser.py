@@ -0,0 +1,128 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from backend.models import StoryPage
+
+
+class StoryStreamParser:
+    """
+    Incremental parser for the story JSON as the LLM streams it.
+
+    feed() returns the pages completed by each chunk, so media generation can
+    start before the rest of the story has been written. Top-level fields and
+    pages are parsed one at a time, so a malformed page or field only loses
+    that value instead of the whole story. Text before the first "{" (such as
+    the agent's "Final Answer:" prefix) and after the closing "}" is ignored.
+    """
+
+    def __init__(self):
+        self.pages: Dict[int, StoryPage] = {}  # Complete pages by page number
+        self.raw_fields: Dict[str, str] = {}  # Raw JSON of each complete top-level value except the pages
+        self.errors: List[str] = []
+        self.finished = False  # The closing "}" of the story has been seen
+
+        self._text = ""
+        self._position = 0
+        self._stack: List[str] = []  # Open "{" and "[" from the story object down
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._page_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[StoryPage]:
+        """Parse the next chunk of the response; returns the pages it completed."""
+        self._text += chunk
+        completed = []
+        text = self._text
+        while self._position < len(text) and not self.finished:
+            position, char = self._position, text[self._position]
+            self._position += 1
+
+            if not self._stack:
+                if char == "{":
+                    self._stack.append("{")
+                    self._expect_key = True
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._expect_key:
+                        self._key = self._loads(text[self._string_start:position + 1], "key")
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+                self._mark_value_start(position)
+            elif char in "{[":
+                self._mark_value_start(position)
+                if self._stack == ["{", "["] and self._key == "pages" and char == "{":
+                    self._page_start = position
+                self._stack.append(char)
+            elif char in "}]":
+                self._stack.pop()
+                if self._stack == ["{", "["] and self._page_start is not None:
+                    page = self._parse_page(text[self._page_start:position + 1])
+                    self._page_start = None
+                    if page:
+                        completed.append(page)
+                elif not self._stack:
+                    self._end_field(position)
+                    self.finished = True
+            elif len(self._stack) == 1:
+                if char == ":":
+                    self._expect_key = False
+                elif char == ",":
+                    self._end_field(position)
+                    self._expect_key = True
+                elif not char.isspace():
+                    self._mark_value_start(position)
+        return completed
+
+    def fields(self) -> Dict[str, Any]:
+        """The top-level values parsed so far, leaving out any that are malformed."""
+        fields = {}
+        for key, raw in self.raw_fields.items():
+            value = self._loads(raw, f"field '{key}'")
+            if value is not None:
+                fields[key] = value
+        return fields
+
+    def _mark_value_start(self, position: int) -> None:
+        if len(self._stack) == 1 and not self._expect_key and self._value_start is None:
+            self._value_start = position
+
+    def _end_field(self, position: int) -> None:
+        if self._key is not None and self._value_start is not None and self._key != "pages":
+            self.raw_fields[self._key] = self._text[self._value_start:position].strip()
+        self._key = None
+        self._value_start = None
+
+    def _parse_page(self, raw: str) -> Optional[StoryPage]:
+        data = self._loads(raw, "page")
+        if data is None:
+            return None
+        try:
+            page = StoryPage(**data)
+        except (TypeError, ValidationError) as e:
+            self.errors.append(f"Invalid page: {str(e)}")
+            return None
+        self.pages[page.page_number] = page
+        return page
+
+    def _loads(self, raw: str, what: str) -> Any:
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.errors.append(f"Malformed {what}: {str(e)}")
+            return None
@@ -1,20 +1,61 @@
 from crewai import Agent, Task, Crew, LLM
+try:
+    from crewai.events import crewai_event_bus, LLMCallStartedEvent, LLMStreamChunkEvent
+except ImportError:  # crewai < 1.0
+    from crewai.utilities.events import crewai_event_bus, LLMCallStartedEvent, LLMStreamChunkEvent
 import os
 import sys
+import threading
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from backend.models import StoryOutput, StoryPage
+from backend.agents.story_stream_parser import StoryStreamParser
 import json
 import asyncio
 
 # Load environment variables
 load_dotenv()
 
+# Crew runs that re-request only the pages and fields missing from a malformed story
+STORY_RETRIES = 2
+REQUIRED_FIELDS = ("title", "moral", "age_group")
+
+# Called with each page as soon as it has been written
+PageCallback = Callable[[StoryPage], None]
+
+# Parsers receiving the streamed output of each story LLM, by the LLM's id, called with each chunk and
+# the id of the LLM call it belongs to. One handler is registered for the whole process: the event bus
+# is global, and older crewai versions can't unregister handlers.
+_stream_parsers: Dict[int, Callable[[Optional[str], Optional[str]], None]] = {}
+_stream_parsers_lock = threading.Lock()
+
+# crewai >= 1.0 runs most event handlers in a thread pool, so a call's LLMCallStartedEvent can arrive
+# after its first chunks; there every chunk carries its call id instead, and a new id starts a new response.
+# Older versions run every handler synchronously and have no call id.
+_CHUNKS_HAVE_CALL_ID = "call_id" in LLMStreamChunkEvent.model_fields
+
+def _stream_parser_for(source) -> Optional[Callable[[Optional[str], Optional[str]], None]]:
+    with _stream_parsers_lock:
+        return _stream_parsers.get(id(source))
+
+if not _CHUNKS_HAVE_CALL_ID:
+    @crewai_event_bus.on(LLMCallStartedEvent)
+    def _on_llm_call_started(source, event):
+        parser = _stream_parser_for(source)
+        if parser:
+            parser(None, None)  # The agent is calling the LLM again: start a new response
+
+@crewai_event_bus.on(LLMStreamChunkEvent)
+def _on_llm_stream_chunk(source, event):
+    parser = _stream_parser_for(source)
+    if parser:
+        parser(event.chunk, getattr(event, "call_id", None))
+
 class StoryWritingAgent:
     def __init__(self):
         self.model = os.getenv("AGENT_MODEL", "gpt-4")
@@ -22,12 +63,15 @@ class StoryWritingAgent:
         self.api_key = os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
+        # Built once and reused by every story
+        self.story_agent = self.__createAgent()
 
     def __createAgent(self) -> Agent:
         llm = LLM(
             model=self.model,
             temperature=self.temperature,
-            api_key=self.api_key
+            api_key=self.api_key,
+            stream=True  # Pages are parsed as they are written
         )
         return Agent(
             role="Children's Story Writer and Illustrator",
@@ -96,6 +140,41 @@ class StoryWritingAgent:
             agent=agent
         )
 
+    def __createRepairTask(self, agent: Agent, prompt: str, story_so_far: dict,
+                           missing_pages: List[int], missing_fields: List[str], max_pages: int) -> Task:
+        parts = []
+        if missing_pages:
+            parts.append(f"{'page' if len(missing_pages) == 1 else 'pages'} "
+                         f"{', '.join(str(number) for number in missing_pages)} "
+                         f"(page 0 is the cover page and page {max_pages + 1} is the end page)")
+        if missing_fields:
+            parts.append(f"the {'field' if len(missing_fields) == 1 else 'fields'} {', '.join(missing_fields)}")
+        return Task(
+            description=f"""Finish a children's story based on the following prompt: {prompt}
+            
+            This is the story so far, as JSON:
+            {json.dumps(story_so_far, indent=2)}
+            
+            Write ONLY {" and ".join(parts)}, consistent with the rest of the story and in the same style.
+            
+            Format the output as a JSON object containing only these keys:
+            {{
+                "pages": [
+                    {{
+                        "page_number": 1,
+                        "content": "Page content...",
+                        "image_prompt": "Page image prompt..."
+                    }}
+                ],
+                "title": "Story Title",
+                "moral": "The moral of the story",
+                "age_group": "Target age group"
+            }}
+            """,
+            expected_output="The missing parts of the story in JSON format",
+            agent=agent
+        )
+
     def _extract_response_text(self, crew_output) -> str:
         """Extract the text content from a CrewOutput object."""
         if hasattr(crew_output, 'raw_output'):
@@ -104,38 +183,112 @@ class StoryWritingAgent:
             return str(crew_output.output)
         return str(crew_output)
 
-    def write_story(self, prompt: str, max_pages: Optional[int] = None) -> tuple[StoryOutput, dict]:
-        """Generate a story based on the user's prompt with optional page limit"""
-        # Create agent and task
-        agent = self.__createAgent()
-        task = self.__createTask(agent, prompt, max_pages)
-        
-        # Create and run the crew
-        crew = Crew(
-            agents=[agent],
-            tasks=[task],
-            verbose=True
-        )
+    def _stream_crew(self, agent: Agent, task: Task, on_page: Callable[[StoryPage], None]) -> StoryStreamParser:
+        """Run a crew, passing each page to on_page as soon as it streams in; returns the parsed final answer."""
+        stream_parser = StoryStreamParser()
+        current_call: Optional[str] = None
 
-        # Get response
-        crew_output = crew.kickoff()
-        
-        # Extract the text content from the CrewOutput
-        response_text = self._extract_response_text(crew_output)
-        
-        # Parse the JSON response into our Pydantic model
+        def on_chunk(chunk: Optional[str], call_id: Optional[str]):
+            nonlocal stream_parser, current_call
+            if chunk is None or call_id != current_call:
+                # The agent is calling the LLM again: start a new response
+                stream_parser = StoryStreamParser()
+                current_call = call_id
+            if chunk is None:
+                return
+            for page in stream_parser.feed(chunk):
+                on_page(page)
+
+        with _stream_parsers_lock:
+            _stream_parsers[id(agent.llm)] = on_chunk
         try:
-            story_data = json.loads(response_text)
-            story_output = StoryOutput(**story_data)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to parse story output: {str(e)}")
+            crew = Crew(
+                agents=[agent],
+                tasks=[task],
+                verbose=True
+            )
+            crew_output = crew.kickoff()
+        finally:
+            with _stream_parsers_lock:
+                del _stream_parsers[id(agent.llm)]
+
+        # The final answer is authoritative; it also covers LLMs that don't stream
+        final_parser = StoryStreamParser()
+        for page in final_parser.feed(self._extract_response_text(crew_output)):
+            on_page(page)
+        return final_parser
+
+    def write_story(self, prompt: str, max_pages: Optional[int] = None,
+                    on_page: Optional[PageCallback] = None) -> tuple[StoryOutput, dict]:
+        """
+        Generate a story based on the user's prompt with optional page limit.
+
+        The response is parsed as it streams, and on_page is called with each
+        page as soon as it is complete, so media generation can start while the
+        rest of the story is being written. Pages and fields are parsed one at
+        a time: if some are malformed or missing, only those are requested
+        again (up to STORY_RETRIES times).
+        """
+        max_pages = max_pages or 3  # Default to 3 pages if not specified
+        pages: Dict[int, StoryPage] = {}
+        fields: dict = {}
+        reported: Dict[int, StoryPage] = {}
+
+        def report(page: StoryPage):
+            # Pages written by a repair run only fill gaps, and each page is reported once
+            if page.page_number in pages and pages[page.page_number] != page:
+                return
+            if on_page and reported.get(page.page_number) != page:
+                reported[page.page_number] = page
+                on_page(page)
+
+        # Stories written at the same time each need their own executor state and LLM stream
+        agent = self.story_agent.copy()
+        task = self.__createTask(agent, prompt, max_pages)
+        attempts = 0
+        while True:
+            story_parser = self._stream_crew(agent, task, report)
+            for number, page in story_parser.pages.items():
+                pages.setdefault(number, page)
+            for key, value in story_parser.fields().items():
+                fields.setdefault(key, value)
+
+            missing_pages = [number for number in range(max_pages + 2) if number not in pages]
+            missing_fields = [key for key in REQUIRED_FIELDS if not isinstance(fields.get(key), str)]
+            if not missing_pages and not missing_fields:
+                break
+            if attempts == STORY_RETRIES:
+                problems = story_parser.errors or ["incomplete response"]
+                raise ValueError(
+                    f"Failed to parse story output: missing pages {missing_pages} and fields {missing_fields} "
+                    f"after {attempts} retries ({'; '.join(problems)})"
+                )
+
+            attempts += 1
+            print(f"Story incomplete, requesting pages {missing_pages} and fields {missing_fields} again")
+            story_so_far = {**{key: fields[key] for key in REQUIRED_FIELDS if key in fields},
+                            "pages": [page.model_dump() for _, page in sorted(pages.items())]}
+            task = self.__createRepairTask(agent, prompt, story_so_far, missing_pages, missing_fields, max_pages)
+
+        story_pages = [page for _, page in sorted(pages.items())]
+        word_count = fields.get("word_count")
+        if not isinstance(word_count, int):
+            word_count = sum(len(page.content.split()) for page in story_pages)
+        story_output = StoryOutput(
+            title=fields["title"],
+            pages=story_pages,
+            moral=fields["moral"],
+            age_group=fields["age_group"],
+            word_count=word_count
+        )
         
         # Prepare metadata
         metadata = {
             "model": self.model,
             "temperature": self.temperature,
             "timestamp": datetime.now().isoformat(),
-            "page_count": len(story_output.pages)
+            "page_count": len(story_output.pages),
+            "repair_attempts": attempts
         }
 
         return story_output, metadata
@@ -1,17 +1,22 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, field_validator
 from typing import Optional, List, Dict
 import asyncio
-from pathlib import Path
 import json
+import sys
+from pathlib import Path
 from datetime import datetime
 
-from agents.story_writing_agent import StoryWritingAgent
-from agents.image_agent import ImageGenerationAgent
-from audio_generator.elevenlabs_storyteller import ElevenLabsStoryteller
-from movie_generator.movie_compiler import create_story_video
-from models import StoryOutput, StoryPage
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from backend.agents.story_writing_agent import StoryWritingAgent
+from backend.job_queue import JobQueue, COMPLETED, ERROR
+from backend.movie_generator.movie_compiler import OUTPUT_PROFILES
+from backend.worker import COMPILE_JOB
 
 app = FastAPI(
     title="Storybook Generator API",
@@ -44,47 +49,68 @@ class CompileRequest(BaseModel):
     story: StoryResponse
     background_music: Optional[bool] = True
     voice_id: Optional[str] = "21m00Tcm4TlvDq8ikWAM"  # Default ElevenLabs voice ID
+    profile: Optional[str] = None  # Video output profile (preview, standard or archive); default VIDEO_PROFILE
+
+    @field_validator("profile")
+    @classmethod
+    def check_profile(cls, profile: Optional[str]) -> Optional[str]:
+        if profile is not None and profile not in OUTPUT_PROFILES:
+            raise ValueError(f"Unknown output profile '{profile}', expected one of: {', '.join(OUTPUT_PROFILES)}")
+        return profile
 
 class CompileResponse(BaseModel):
     status: str
-    video_path: Optional[str]
-    error: Optional[str]
-    progress: Dict[str, str]
+    task_id: str
+    message: str
 
-# Store compilation progress
-compilation_progress = {}
+class CompilationStatus(BaseModel):
+    task_id: str
+    status: str
+    message: Optional[str]
+    progress: Dict[str, Dict[str, int]]
+    video_path: Optional[str] = None
+    video_url: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
 
-async def compile_storybook(story: StoryResponse, background_music: bool, voice_id: str, task_id: str):
-    try:
-        # Update progress
-        compilation_progress[task_id] = {"status": "starting", "message": "Initializing compilation"}
-        
-        # 1. Generate images
-        compilation_progress[task_id] = {"status": "generating_images", "message": "Generating images for each page"}
-        image_agent = ImageGenerationAgent()
-        await image_agent.generate_images(story)
-        
-        # 2. Generate audio
-        compilation_progress[task_id] = {"status": "generating_audio", "message": "Generating audio narration"}
-        audio_generator = ElevenLabsStoryteller()
-        await audio_generator.generate_audio(story, voice_id)
-        
-        # 3. Compile video
-        compilation_progress[task_id] = {"status": "compiling_video", "message": "Creating final video"}
-        video_path = await create_story_video(story, background_music)
-        
-        # Update final status
-        compilation_progress[task_id] = {
-            "status": "completed",
-            "message": "Storybook compilation completed",
-            "video_path": video_path
-        }
-        
-    except Exception as e:
-        compilation_progress[task_id] = {
-            "status": "error",
-            "message": str(e)
-        }
+# Compilation jobs are run by the worker pool (backend/worker.py), not by the API process
+job_queue = JobQueue()
+
+# Story writer shared by all requests, created on first use
+story_agent: Optional[StoryWritingAgent] = None
+
+# Generated assets served under /assets/{kind}/{filename}: their directory and file type
+output_dir = project_root / "output"
+ASSET_DIRS = {
+    "images": (output_dir / "images", ".png"),
+    "audio": (output_dir / "audio", ".mp3"),
+    "segments": (output_dir / "segments", ".mp4"),
+    "videos": (output_dir, ".mp4"),
+}
+# Images, audio and segments are named by a hash of their content, so a URL always serves the same bytes.
+# Videos are named by story and profile and are replaced by re-renders, so clients revalidate them.
+CONTENT_ADDRESSED = {"images", "audio", "segments"}
+EVENT_POLL_INTERVAL = 0.5  # Seconds between checks of the job queue for new events
+KEEP_ALIVE_INTERVAL = 15  # Seconds of silence before an event stream sends a keep-alive comment
+
+def asset_url(path: Optional[str]) -> Optional[str]:
+    """URL of a generated asset served by this API, or None if the path isn't one."""
+    if not path:
+        return None
+    path = Path(path)
+    for kind, (directory, suffix) in ASSET_DIRS.items():
+        if path.parent == directory and path.suffix == suffix:
+            return f"/assets/{kind}/{path.name}"
+    return None
+
+def event_message(event: dict) -> str:
+    """Format a job event as a server-sent event, adding URLs for the assets it reports."""
+    data = dict(event["data"])
+    for key in ("path", "video_path"):
+        if key in data:
+            data[key.replace("path", "url")] = asset_url(data[key])
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(data)}\n\n"
 
 @app.get("/")
 async def root():
@@ -93,11 +119,15 @@ async def root():
 @app.post("/generate-story", response_model=StoryResponse)
 async def generate_story(request: StoryRequest):
     try:
-        # Initialize the story writing agent
-        story_agent = StoryWritingAgent()
+        # Initialize the story writing agent once and reuse it for every request
+        global story_agent
+        if story_agent is None:
+            story_agent = StoryWritingAgent()
         
         # Generate the story
-        story_output, metadata = story_agent.write_story(
+        # Run the blocking crew off the event loop so status requests keep being served
+        story_output, metadata = await asyncio.to_thread(
+            story_agent.write_story,
             prompt=request.prompt,
             max_pages=request.max_pages
         )
@@ -118,35 +148,131 @@ async def generate_story(request: StoryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/compile-storybook", response_model=CompileResponse)
-async def compile_storybook_endpoint(request: CompileRequest, background_tasks: BackgroundTasks):
+async def compile_storybook_endpoint(request: CompileRequest):
     try:
-        # Generate a unique task ID
-        task_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Start compilation in background
-        background_tasks.add_task(
-            compile_storybook,
-            request.story,
-            request.background_music,
-            request.voice_id,
-            task_id
-        )
+        # Queue the compilation; the job ID is unique and stays valid across restarts
+        task_id = job_queue.enqueue(COMPILE_JOB, {
+            "story": request.story.model_dump(exclude={"metadata"}),
+            "background_music": request.background_music,
+            "voice_id": request.voice_id,
+            "profile": request.profile,
+        })
         
         return {
-            "status": "started",
+            "status": "queued",
             "task_id": task_id,
-            "message": "Storybook compilation started"
+            "message": "Storybook compilation queued"
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/compilation-status/{task_id}")
+@app.get("/compilation-status/{task_id}", response_model=CompilationStatus)
 async def get_compilation_status(task_id: str):
-    if task_id not in compilation_progress:
+    job = job_queue.get(task_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return compilation_progress[task_id]
+    return {
+        "task_id": job["id"],
+        "status": job["status"],
+        "message": job["message"],
+        "progress": job["progress"],
+        "video_path": (job["result"] or {}).get("video_path"),
+        "video_url": asset_url((job["result"] or {}).get("video_path")),
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+def serve_file(path: Path, content_addressed: bool, if_none_match: Optional[str]) -> Response:
+    """
+    Serve a generated file with an ETag and cache headers.
+
+    Range requests (for seeking in audio and video, and resuming downloads)
+    are answered with 206 partial content, and a request whose If-None-Match
+    matches the current ETag gets 304 Not Modified with no body.
+    """
+    stat_result = path.stat()
+    if content_addressed:
+        etag = f'"{path.stem}"'
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+        cache_control = "no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if if_none_match:
+        client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in client_etags or "*" in client_etags:
+            return Response(status_code=304, headers=headers)
+    return FileResponse(path, stat_result=stat_result, headers=headers)
+
+@app.get("/compilation-events/{task_id}")
+async def stream_compilation_events(task_id: str, last_event_id: Optional[int] = Header(None)):
+    """
+    Server-sent events for a compilation, pushed as the workers record them.
+
+    Events are image, audio and segment (with page_number and the asset's url)
+    as each page's assets finish, video when the final video is joined, and
+    completed or error at the end, which closes the stream. Clients that
+    reconnect with Last-Event-ID resume after the last event they received.
+    """
+    if job_queue.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def event_stream():
+        last_id = last_event_id or 0
+        idle = 0.0
+        finished = False
+        while True:
+            events = await asyncio.to_thread(job_queue.events, task_id, last_id)
+            for event in events:
+                last_id = event["id"]
+                yield event_message(event)
+                if event["type"] in (COMPLETED, ERROR):
+                    return
+            if not events:
+                if finished:
+                    return  # No final event to send (the job ended before events were recorded)
+                job = await asyncio.to_thread(job_queue.get, task_id)
+                if job["status"] in (COMPLETED, ERROR):
+                    # The job ended since the events were read; its final event is committed with
+                    # the status, so read once more to send it
+                    finished = True
+                    continue
+                idle += EVENT_POLL_INTERVAL
+                if idle >= KEEP_ALIVE_INTERVAL:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+            else:
+                idle = 0.0
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.api_route("/compilation-video/{task_id}", methods=["GET", "HEAD"])
+async def get_compilation_video(task_id: str, if_none_match: Optional[str] = Header(None)):
+    """The compiled MP4 of a finished compilation, with range requests for streaming playback and seeking."""
+    job = job_queue.get(task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    video_path = (job["result"] or {}).get("video_path")
+    if job["status"] != COMPLETED or not video_path or not Path(video_path).is_file():
+        raise HTTPException(status_code=404, detail="Video not available")
+    return serve_file(Path(video_path), content_addressed=False, if_none_match=if_none_match)
+
+@app.api_route("/assets/{kind}/{filename}", methods=["GET", "HEAD"])
+async def get_asset(kind: str, filename: str, if_none_match: Optional[str] = Header(None)):
+    """A generated image, narration, page segment or video, as reported by the compilation events."""
+    if kind not in ASSET_DIRS:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    directory, suffix = ASSET_DIRS[kind]
+    path = directory / filename
+    if path.suffix != suffix or path.parent != directory or not path.is_file():
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return serve_file(path, content_addressed=kind in CONTENT_ADDRESSED, if_none_match=if_none_match)
 
 @app.get("/health")
 async def health_check():
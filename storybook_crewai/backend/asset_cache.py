@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+def asset_key(**params) -> str:
+    """Content address of a generated asset: the hash of everything that determines it."""
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AssetCache:
+    """
+    Content-addressed store for generated images and audio.
+
+    Assets are named by their key, so reruns and other stories reuse anything
+    generated with the same inputs, and stories with the same title never
+    overwrite each other.
+    """
+
+    def __init__(self, directory: Path, suffix: str):
+        self.directory = Path(directory)
+        self.suffix = suffix
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of the stored asset, or None if it has not been generated yet."""
+        path = self.path(key)
+        return path if path.exists() else None
+
+    async def get_or_create(self, key: str, create: Callable[[Path], Awaitable[object]]) -> Tuple[Path, bool]:
+        """
+        Return (path, reused) for the asset, calling create(partial_path) only on a miss.
+
+        The asset is written under a temporary name and moved into place once
+        complete, so an interrupted generation is never mistaken for a hit.
+        Concurrent requests for the same key share one generation.
+        """
+        path = self.get(key)
+        if path:
+            return path, True
+        if key not in self._in_flight:
+            self._in_flight[key] = asyncio.ensure_future(self._create(key, create))
+        try:
+            return await asyncio.shield(self._in_flight[key]), False
+        finally:
+            if self._in_flight.get(key) and self._in_flight[key].done():
+                del self._in_flight[key]
+
+    async def _create(self, key: str, create: Callable[[Path], Awaitable[object]]) -> Path:
+        path = self.path(key)
+        partial_path = path.with_name(path.name + ".part")
+        try:
+            await create(partial_path)
+            os.replace(partial_path, path)
+        finally:
+            partial_path.unlink(missing_ok=True)
+        return path
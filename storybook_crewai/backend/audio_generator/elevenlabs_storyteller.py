@@ -3,29 +3,55 @@ import uuid
 import sys
 import asyncio
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
 
+import httpx
 from dotenv import load_dotenv
 from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
+from elevenlabs.client import AsyncElevenLabs
 # Add the project root to the Python path
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from backend.models import StoryOutput, StoryPage
+from backend.rate_limiter import AsyncRateLimiter
+from backend.audio_generator.fake_tts import FakeElevenLabs
+from backend.asset_cache import AssetCache, asset_key
 
 load_dotenv()
 
+# Called with (page, audio_path, error) as each page finishes
+PageProgressCallback = Callable[[StoryPage, Optional[Path], Optional[Exception]], None]
+
 class StoryAudioGenerator:
-    def __init__(self, output_dir: Optional[Path] = None, voice_id: str = "pNInz6obpgDQGcFmaJgB"):
-        """Initialize the audio generator with an output directory and voice settings."""
-        # Load API key
-        self.api_key = os.getenv("ELEVENLABS_API_KEY")
-        if not self.api_key:
-            raise ValueError("ELEVENLABS_API_KEY environment variable not set")
-            
-        # Initialize client
-        self.client = ElevenLabs(api_key=self.api_key)
+    def __init__(self, output_dir: Optional[Path] = None, voice_id: str = "pNInz6obpgDQGcFmaJgB",
+                 client=None, max_concurrency: Optional[int] = None, requests_per_minute: Optional[float] = None):
+        """
+        Initialize the audio generator with an output directory and voice settings.
+
+        Set TTS_BACKEND=fake (or pass a client) to synthesise silent audio locally instead
+        of calling ElevenLabs, e.g. for testing the pipeline offline.
+        """
+        # Initialize client; only one created here is closed by aclose()
+        self._http_client: Optional[httpx.AsyncClient] = None
+        if client is not None:
+            self.client = client
+        elif os.getenv("TTS_BACKEND", "elevenlabs") == "fake":
+            self.client = FakeElevenLabs()
+        else:
+            # Load API key
+            self.api_key = os.getenv("ELEVENLABS_API_KEY")
+            if not self.api_key:
+                raise ValueError("ELEVENLABS_API_KEY environment variable not set")
+            self._http_client = httpx.AsyncClient(timeout=240, follow_redirects=True)
+            self.client = AsyncElevenLabs(api_key=self.api_key, httpx_client=self._http_client)
+
+        # Pages synthesised at the same time, and TTS requests started per minute (0 = no limit)
+        self.max_concurrency = max_concurrency or int(os.getenv("TTS_CONCURRENCY", "3"))
+        if requests_per_minute is None:
+            requests_per_minute = float(os.getenv("TTS_REQUESTS_PER_MINUTE", "0"))
+        self.rate_limiter = AsyncRateLimiter(requests_per_minute)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
         
         # Set output directory
         if output_dir is None:
@@ -34,11 +60,13 @@ class StoryAudioGenerator:
         else:
             self.output_dir = output_dir
             
-        # Ensure output directory exists
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Content-addressed store in the output directory (created if it doesn't exist)
+        self.cache = AssetCache(self.output_dir, ".mp3")
         
         # Voice settings
         self.voice_id = voice_id
+        self.model_id = "eleven_turbo_v2"
+        self.output_format = "mp3_22050_32"
         self.voice_settings = VoiceSettings(
             stability=0.5,
             similarity_boost=0.75,
@@ -46,47 +74,86 @@ class StoryAudioGenerator:
             use_speaker_boost=True,
         )
         
-    async def _generate_audio_file(self, text: str, filename: str) -> Path:
-        """Generate audio file from text and save it."""
+    async def aclose(self) -> None:
+        """Close the ElevenLabs connection pool, on the event loop that used it."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+
+    def audio_key(self, text: str, voice_id: Optional[str] = None) -> str:
+        """Content address of the narration for a text with the given (or current) voice and the current model"""
+        return asset_key(kind="audio", backend=getattr(self.client, "backend", "elevenlabs"), text=text,
+                         model=self.model_id, voice_id=voice_id or self.voice_id,
+                         voice_settings=self.voice_settings.model_dump(), output_format=self.output_format)
+
+    async def _generate_audio_file(self, text: str, output_path: Path, voice_id: Optional[str] = None) -> Path:
+        """Generate audio file from text, streaming it to disk as the chunks arrive."""
+        await self.rate_limiter.wait()
+
         # Generate audio
         response = self.client.text_to_speech.convert(
-            voice_id=self.voice_id,
+            voice_id=voice_id or self.voice_id,
             optimize_streaming_latency="0",
-            output_format="mp3_22050_32",
+            output_format=self.output_format,
             text=text,
-            model_id="eleven_turbo_v2",
+            model_id=self.model_id,
             voice_settings=self.voice_settings,
         )
         
         # Save file
-        output_path = self.output_dir / filename
         with open(output_path, "wb") as f:
-            for chunk in response:
+            async for chunk in response:
                 if chunk:
-                    f.write(chunk)
+                    await asyncio.to_thread(f.write, chunk)
                     
         return output_path
         
-    async def generate_story_audio(self, story: StoryOutput) -> List[Path]:
-        """Generate audio files for each page of the story."""
-        # Create tasks for each page
-        tasks = []
-        for page in story.pages:
-            # Generate filename based on page number and story title
-            filename = f"page_{page.page_number}_{story.title.lower().replace(' ', '_')}.mp3"
-            
-            # Create task for this page
-            task = self._generate_audio_file(page.content, filename)
-            tasks.append(task)
-            
-        # Wait for all tasks to complete
-        audio_files = await asyncio.gather(*tasks)
-        
-        # Print results
-        for i, audio_path in enumerate(audio_files, 1):
-            print(f"Generated audio for page {i}: {audio_path}")
-            
-        return audio_files
+    async def generate_story_audio(self, story: StoryOutput,
+                                   on_progress: Optional[PageProgressCallback] = None) -> List[Path]:
+        """
+        Generate audio files for each page of the story concurrently.
+
+        At most max_concurrency pages are synthesised at once, under the rate
+        limit. Progress is reported per page as pages finish. Returns the audio
+        paths in page order.
+
+        Audio is stored by content address, so only pages whose text or voice
+        settings changed are synthesised again.
+        """
+        finished = 0
+
+        async def generate_page(page: StoryPage) -> Path:
+            nonlocal finished
+
+            try:
+                audio_path, reused = await self.generate_page_audio(page)
+            except Exception as e:
+                if on_progress:
+                    on_progress(page, None, e)
+                raise
+            finished += 1
+            action = "Reused" if reused else "Generated"
+            print(f"[{finished}/{len(story.pages)}] {action} audio for page {page.page_number}: {audio_path}")
+            if on_progress:
+                on_progress(page, audio_path, None)
+            return audio_path
+
+        # Wait for all pages to complete
+        return await asyncio.gather(*(generate_page(page) for page in story.pages))
+
+    async def generate_page_audio(self, page: StoryPage, voice_id: Optional[str] = None) -> Tuple[Path, bool]:
+        """
+        Generate the narration for one page, for pipelines that handle each page as soon as it exists.
+
+        Returns (audio_path, reused). Calls share the generator's concurrency
+        and rate limits, and reuse stored audio when the text is unchanged.
+        voice_id overrides the generator's voice, so one generator can serve
+        stories narrated by different voices.
+        """
+        async def generate(output_path: Path):
+            async with self.semaphore:
+                await self._generate_audio_file(page.content, output_path, voice_id)
+
+        return await self.cache.get_or_create(self.audio_key(page.content, voice_id), generate)
         
     # def set_voice_settings(self, stability: float = None, 
     #                       similarity_boost: float = None, 
@@ -0,0 +1,51 @@
+import asyncio
+import re
+import subprocess
+from typing import AsyncIterator, Optional
+
+import imageio_ffmpeg
+
+# Narration pace used to size the fake audio, roughly 150 words per minute
+WORDS_PER_SECOND = 2.5
+
+
+class FakeTextToSpeech:
+    """Offline stand-in for AsyncElevenLabs.text_to_speech, returning silent MP3 audio."""
+
+    def __init__(self, latency: float = 0.0, chunk_size: int = 4096):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def _silent_mp3(self, duration: float, output_format: Optional[str]) -> bytes:
+        """Encode `duration` seconds of silence with the sample rate and bitrate of the requested format."""
+        match = re.fullmatch(r"mp3_(\d+)_(\d+)", output_format or "")
+        sample_rate, bitrate = match.groups() if match else ("22050", "32")
+        return subprocess.run(
+            [
+                imageio_ffmpeg.get_ffmpeg_exe(), "-loglevel", "error",
+                "-f", "lavfi", "-i", f"anullsrc=r={sample_rate}:cl=mono", "-t", f"{duration:.2f}",
+                "-b:a", f"{bitrate}k", "-f", "mp3", "pipe:1",
+            ],
+            check=True, capture_output=True,
+        ).stdout
+
+    async def convert(self, voice_id: str, *, text: str, output_format: Optional[str] = None,
+                      **kwargs) -> AsyncIterator[bytes]:
+        """Mimic the streaming convert call: wait `latency`, then yield the audio in chunks."""
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        duration = max(1.0, len(text.split()) / WORDS_PER_SECOND)
+        audio = await asyncio.to_thread(self._silent_mp3, duration, output_format)
+        for start in range(0, len(audio), self.chunk_size):
+            yield audio[start:start + self.chunk_size]
+
+
+class FakeElevenLabs:
+    """Offline stand-in for the AsyncElevenLabs client, for running the pipeline without an API key."""
+
+    backend = "fake"  # Kept apart from real narration in the asset cache
+
+    def __init__(self, latency: float = 0.0):
+        self.text_to_speech = FakeTextToSpeech(latency)
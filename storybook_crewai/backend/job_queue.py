@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+project_root = Path(__file__).parent.parent
+DEFAULT_DB_PATH = project_root / os.getenv("JOB_DB_PATH", "output/jobs.sqlite3")  # Relative paths are from the project root
+
+# Overall job status; while running, the status names the stage in progress
+QUEUED = "queued"
+COMPLETED = "completed"
+ERROR = "error"
+
+
+class JobQueue:
+    """
+    Durable local job queue backed by SQLite.
+
+    The API enqueues jobs and reads their progress; worker processes claim and
+    run them. Jobs, their per-stage progress and their results survive
+    restarts, and jobs left running when the workers stopped are queued again.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or DEFAULT_DB_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # Readers (the API) never wait on the workers' writes
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    message TEXT,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS events_job ON events (job_id, id)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["progress"] = json.loads(job["progress"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], message: str = "Waiting for a worker") -> str:
+        """Add a job and return its unique ID."""
+        job_id = uuid.uuid4().hex
+        now = self._now()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, message, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, message, now, now)
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued job for a worker, or return None if there is none."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, message = ?, worker = ?, updated_at = ? WHERE id = ?",
+                    ("starting", "Initializing compilation", worker, self._now(), row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"])
+
+    def update(self, job_id: str, status: str, message: str, stage: Optional[str] = None, **stage_progress) -> None:
+        """Record the job's current status, and merge stage_progress into the progress of one stage."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            progress = json.loads(conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+            if stage:
+                progress[stage] = {**progress.get(stage, {}), **stage_progress}
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, progress = ?, updated_at = ? WHERE id = ?",
+                (status, message, json.dumps(progress), self._now(), job_id)
+            )
+            conn.execute("COMMIT")
+
+    def complete(self, job_id: str, result: Dict[str, Any], message: str) -> None:
+        # One transaction, so a reader that sees the final status also sees the final event
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, result = ?, updated_at = ? WHERE id = ?",
+                (COMPLETED, message, json.dumps(result), self._now(), job_id)
+            )
+            self._insert_event(conn, job_id, COMPLETED, message=message, **result)
+            conn.execute("COMMIT")
+
+    def fail(self, job_id: str, error: str) -> None:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, error = ?, updated_at = ? WHERE id = ?",
+                (ERROR, error, error, self._now(), job_id)
+            )
+            self._insert_event(conn, job_id, ERROR, message=error)
+            conn.execute("COMMIT")
+
+    def add_event(self, job_id: str, event_type: str, **data) -> int:
+        """Record a progress event for a job; returns its ID, which increases with every event."""
+        with self._connect() as conn:
+            return self._insert_event(conn, job_id, event_type, **data)
+
+    def _insert_event(self, conn: sqlite3.Connection, job_id: str, event_type: str, **data) -> int:
+        cursor = conn.execute(
+            "INSERT INTO events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, event_type, json.dumps(data), self._now())
+        )
+        return cursor.lastrowid
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """The job's events with an ID above `after`, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM events WHERE job_id = ? AND id > ? ORDER BY id", (job_id, after)
+            ).fetchall()
+        return [{**dict(row), "data": json.loads(row["data"])} for row in rows]
+
+    def requeue_unfinished(self) -> int:
+        """Queue again the jobs left mid-run by a stopped worker pool; returns how many."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, worker = NULL, updated_at = ? WHERE status NOT IN (?, ?, ?)",
+                (QUEUED, "Requeued after a worker restart", self._now(), QUEUED, COMPLETED, ERROR)
+            )
+            return cursor.rowcount
@@ -0,0 +1,89 @@
+"""
+Caption rendering benchmark
+
+Renders the frames of a synthetic 5-page story with the moviepy compositing
+path and with the precomposed caption fast path, and prints frames per second
+for each. Runs offline: images are solid colours and narration comes from the
+fake TTS backend.
+
+Usage:
+    python backend/movie_generator/benchmark_captions.py --font /path/to/font.ttf
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from backend.audio_generator.elevenlabs_storyteller import StoryAudioGenerator
+from backend.audio_generator.fake_tts import FakeElevenLabs
+from backend.models import StoryOutput, StoryPage
+from backend.movie_generator.movie_compiler import StoryVideoCompiler
+
+PAGE_TEXT = ("Once upon a time, in a small village, there lived a little girl named Emma. "
+             "She had a big heart and loved helping others. ")
+
+
+def make_story(pages: int = 5) -> StoryOutput:
+    return StoryOutput(
+        title="Benchmark Story",
+        pages=[
+            StoryPage(page_number=n, content="Benchmark Story" if n == 0 else PAGE_TEXT * 2, image_prompt=f"page {n}")
+            for n in range(pages)
+        ],
+        moral="Measure before optimising",
+        age_group="6-11",
+        word_count=0
+    )
+
+
+def frames_per_second(compiler: StoryVideoCompiler, story: StoryOutput, image_paths, audio_paths) -> float:
+    frames, start = 0, time.perf_counter()
+    for page, image_path, audio_path in zip(story.pages, image_paths, audio_paths):
+        clip = compiler._create_page_clip(page, image_path, audio_path)
+        for _ in clip.iter_frames(fps=compiler.fps):
+            frames += 1
+        clip.close()
+    return frames / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare caption rendering speed with and without the fast path.")
+    parser.add_argument("--font", help="Caption font (name or .ttf path); defaults to the compiler's font")
+    parser.add_argument("--size", type=int, default=1024, help="Page image size in pixels")
+    args = parser.parse_args()
+
+    story = make_story()
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        image_paths = []
+        for page in story.pages:
+            image_path = work_dir / f"page_{page.page_number}.png"
+            Image.new("RGB", (args.size, args.size), (60 * page.page_number % 255, 150, 220)).save(image_path)
+            image_paths.append(image_path)
+        audio_generator = StoryAudioGenerator(output_dir=work_dir / "audio", client=FakeElevenLabs())
+        audio_paths = asyncio.run(audio_generator.generate_story_audio(story))
+
+        compiler = StoryVideoCompiler(output_dir=work_dir)
+        if args.font:
+            compiler.set_text_style(font=args.font)
+
+        results = {}
+        for fast_captions in (False, True):
+            compiler.fast_captions = fast_captions
+            results[fast_captions] = frames_per_second(compiler, story, image_paths, audio_paths)
+
+    print(f"\nCompositing every frame: {results[False]:.1f} frames/s")
+    print(f"Precomposed captions:    {results[True]:.1f} frames/s ({results[True] / results[False]:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
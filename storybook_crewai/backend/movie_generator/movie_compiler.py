@@ -1,19 +1,113 @@
-from moviepy import ImageClip, AudioFileClip, CompositeVideoClip, TextClip, concatenate_videoclips
+from moviepy import ImageClip, AudioFileClip, CompositeVideoClip, TextClip, VideoClip, concatenate_videoclips
+from moviepy.config import FFMPEG_BINARY
 
+import numpy as np
+import asyncio
+import hashlib
 import os
+import subprocess
 import sys
+import warnings
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 # Add the project root to the Python path
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from backend.models import StoryOutput, StoryPage
+from backend.asset_cache import asset_key
+from PIL import Image
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """Encoding settings for one kind of render."""
+    height: Optional[int]  # Output height in pixels, width follows the aspect ratio; None keeps the image size
+    fps: Optional[int]  # Frame rate of animated renders; None uses the compiler's fps
+    preset: str  # x264 preset: faster presets encode quicker at a larger size
+    crf: int  # x264 constant quality: lower is better quality and larger
+    audio_bitrate: str
+    threads: Optional[int] = None  # Encoder threads; None lets ffmpeg use every core
+
+    def quality_args(self) -> List[str]:
+        """ffmpeg output arguments for quality and resolution."""
+        return ["-crf", str(self.crf)] + (["-vf", f"scale=-2:{self.height}"] if self.height else [])
+
+    def video_args(self) -> List[str]:
+        """ffmpeg output arguments for the video stream, including the preset and thread count."""
+        threads = ["-threads", str(self.threads)] if self.threads else []
+        return ["-preset", self.preset] + self.quality_args() + threads
+
+# Written on every MP4: the moov atom goes at the front, so players can start and seek before the whole file arrives
+FASTSTART_ARGS = ["-movflags", "+faststart"]
+
+# Named output profiles: quick previews for iterative editing, and a high quality final export
+OUTPUT_PROFILES = {
+    "preview": OutputProfile(height=480, fps=12, preset="ultrafast", crf=30, audio_bitrate="64k"),
+    "standard": OutputProfile(height=720, fps=None, preset="medium", crf=23, audio_bitrate="128k"),
+    "archive": OutputProfile(height=None, fps=None, preset="slow", crf=18, audio_bitrate="192k"),
+}
+
+def _file_digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _blend_caption(background: np.ndarray, premultiplied: np.ndarray, transparency: np.ndarray,
+                   x: int, y: int) -> np.ndarray:
+    """Alpha-blend a pre-rendered caption onto a copy of the background, touching only the rows it covers."""
+    frame = background.copy()
+    height, width = frame.shape[:2]
+    caption_height, caption_width = premultiplied.shape[:2]
+    top, bottom = max(y, 0), min(y + caption_height, height)
+    left, right = max(x, 0), min(x + caption_width, width)
+    if top < bottom and left < right:
+        caption = (slice(top - y, bottom - y), slice(left - x, right - x))
+        band = frame[top:bottom, left:right]
+        frame[top:bottom, left:right] = premultiplied[caption] + band * transparency[caption] + 0.5
+    return frame
+
+def _render_segment(compiler: "StoryVideoCompiler", page: StoryPage, image_path: Path, audio_path: Path,
+                    frame_size: Tuple[int, int], segment_path: Path) -> Path:
+    """Process pool worker: render one page to its own MP4 segment."""
+    partial_path = segment_path.with_name(f"{segment_path.stem}.partial.mp4")
+    if compiler.render_mode == "static":
+        _render_still_segment(compiler, page, image_path, audio_path, frame_size, partial_path)
+    else:
+        clip = compiler._create_page_clip(page, image_path, audio_path)
+        if tuple(clip.size) != tuple(frame_size):
+            clip = clip.resized(frame_size)  # Segments must match to be joined without re-encoding
+        compiler._write_clip(clip, partial_path, logger=None)
+        clip.close()
+    os.replace(partial_path, segment_path)
+    return segment_path
+
+def _render_still_segment(compiler: "StoryVideoCompiler", page: StoryPage, image_path: Path, audio_path: Path,
+                          frame_size: Tuple[int, int], output_path: Path) -> None:
+    """Encode a page as one looped still frame with ffmpeg, lasting as long as its own narration."""
+    frame = Image.fromarray(compiler._still_page_frame(page, image_path))
+    if frame.size != tuple(frame_size):
+        frame = frame.resize(frame_size)
+    frame_path = output_path.with_name(f"{output_path.stem}.png")
+    frame.save(frame_path)
+    with AudioFileClip(str(audio_path)) as audio_clip:
+        duration = compiler._page_duration(audio_clip)
+    try:
+        subprocess.run(
+            [FFMPEG_BINARY, "-y", "-loglevel", "error",
+             "-loop", "1", "-framerate", str(compiler.static_fps), "-i", str(frame_path), "-i", str(audio_path),
+             "-af", "apad", "-t", f"{duration:.3f}",
+             "-c:v", "libx264", "-tune", "stillimage", *compiler.profile.video_args(), "-pix_fmt", "yuv420p",
+             "-c:a", "aac", "-b:a", compiler.profile.audio_bitrate, *FASTSTART_ARGS, str(output_path)],
+            check=True
+        )
+    finally:
+        frame_path.unlink(missing_ok=True)
 
 class StoryVideoCompiler:
-    def __init__(self, output_dir: Optional[Path] = None):
-        """Initialize the video compiler with an output directory."""
+    def __init__(self, output_dir: Optional[Path] = None, profile: str = "standard"):
+        """Initialize the video compiler with an output directory and a named output profile (see OUTPUT_PROFILES)."""
         # If no output directory is provided, use the default project structure
         if output_dir is None:
             project_root = Path(__file__).parent.parent
@@ -23,12 +117,16 @@ class StoryVideoCompiler:
             self.output_dir = output_dir / "images"
             self.audio_dir = output_dir / "audio"
             
+        # Rendered page segments, reused by segmented compiles when a page is unchanged
+        self.segments_dir = self.output_dir.parent / "segments"
+            
         # Ensure output directories exist
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.audio_dir.mkdir(parents=True, exist_ok=True)
         
         # Default settings
-        self.duration_per_page = 3  # seconds
+        self.set_profile(profile)
+        self.page_pause = 1  # seconds held after each page's narration
         self.fps = 24
         self.text_font = "Arial Bold"
         self.text_font_size = 30
@@ -37,6 +135,19 @@ class StoryVideoCompiler:
         self.text_padding = 30
         self.line_height = 6
         self.margin = (10,10)
+        # Render each caption once and scroll it with array slicing instead of compositing clips every frame
+        self.fast_captions = True
+        # "animated" scrolls the captions; "static" encodes each page as one still frame at static_fps
+        self.render_mode = "animated"
+        self.static_fps = 1
+        # Segments being rendered by render_page_segment, so identical pages share one render
+        self._segment_renders: Dict[Path, asyncio.Future] = {}
+
+    def __getstate__(self):
+        # The compiler is sent to the segment render processes; in-flight renders stay behind
+        state = self.__dict__.copy()
+        state["_segment_renders"] = {}
+        return state
         
     def _get_image_path(self, page: StoryPage, story: StoryOutput) -> Path:
         """Get the path to the generated image for a page."""
@@ -48,25 +159,16 @@ class StoryVideoCompiler:
         audio_filename = f"page_{page.page_number}_{story.title.lower().replace(' ', '_')}.mp3"
         return self.audio_dir / audio_filename
         
-    def _getTextPostiton(self, text_clip,image_clip,t):
+    def _getTextPostiton(self, text_clip,image_clip,t,duration):
         textH=text_clip.h
-        return ("center", image_clip.h-(t*(textH/(self.duration_per_page))))
-        
-    def _create_page_clip(self, page: StoryPage, image_path: Path, audio_path: Path) -> CompositeVideoClip:
-        """Create a video clip for a single page with image, text, and audio."""
-        # Create image clip
-        image_clip = ImageClip(str(image_path))
-        
-        # Create audio clip
-        audio_clip = AudioFileClip(str(audio_path))
-        
-        # Set duration based on audio length
-        self.set_duration(audio_clip.duration+1)
-        image_clip = image_clip.with_duration(self.duration_per_page)
-        
-        # Create text clip with the page content
-        
+        return ("center", image_clip.h-(t*(textH/(duration))))
 
+    def _page_duration(self, audio_clip: AudioFileClip) -> float:
+        """A page lasts as long as its own narration, plus the pause before the next page."""
+        return audio_clip.duration + self.page_pause
+
+    def _create_text_clip(self, page: StoryPage, image_clip: ImageClip, duration: float) -> TextClip:
+        """Caption for a page: centred on the cover, scrolling up over the image on the other pages."""
         if page.page_number == 0:
             text_clip = TextClip(
             text=page.content,
@@ -79,42 +181,116 @@ class StoryVideoCompiler:
             size=(image_clip.w-self.text_padding, None),
             method='caption') 
 
-            text_clip = text_clip.with_duration(self.duration_per_page)
-            text_clip = text_clip.with_position("center")
-        else:
-            text_clip = TextClip(
-            text=page.content,
-            font=self.text_font,
-            interline=self.line_height,
-            margin = self.margin,
-            font_size=self.text_font_size,
-            color=self.text_color,
-            bg_color=self.text_bg_color,
-            size=(image_clip.w-self.text_padding, None),
-            method='caption'  # Automatically wrap text
-            )
-            text_clip = text_clip.with_duration(self.duration_per_page)
-            text_clip = text_clip.with_position(lambda t: self._getTextPostiton(text_clip,image_clip,t))
-            
+            text_clip = text_clip.with_duration(duration)
+            return text_clip.with_position("center")
+
+        text_clip = TextClip(
+        text=page.content,
+        font=self.text_font,
+        interline=self.line_height,
+        margin = self.margin,
+        font_size=self.text_font_size,
+        color=self.text_color,
+        bg_color=self.text_bg_color,
+        size=(image_clip.w-self.text_padding, None),
+        method='caption'  # Automatically wrap text
+        )
+        text_clip = text_clip.with_duration(duration)
+        return text_clip.with_position(lambda t: self._getTextPostiton(text_clip,image_clip,t,duration))
+        
+    def _create_page_clip(self, page: StoryPage, image_path: Path, audio_path: Path) -> CompositeVideoClip:
+        """Create a video clip for a single page with image, text, and audio."""
+        # Create image clip
+        image_clip = ImageClip(str(image_path))
         
+        # Create audio clip
+        audio_clip = AudioFileClip(str(audio_path))
+        
+        # Set duration based on audio length
+        duration = self._page_duration(audio_clip)
+        image_clip = image_clip.with_duration(duration)
+        
+        # Create text clip with the page content
+        text_clip = self._create_text_clip(page, image_clip, duration)
+            
+        if self.fast_captions:
+            return self._precomposed_page_clip(page, image_clip, text_clip, duration).with_audio(audio_clip)
         
         # Create composite clip with audio
         return CompositeVideoClip([image_clip, text_clip]).with_audio(audio_clip)
+
+    def _caption_layers(self, image_clip: ImageClip, text_clip: TextClip):
+        """Page image as uint8, and the caption premultiplied by its alpha plus its transparency, as float arrays."""
+        background = image_clip.get_frame(0).astype(np.uint8)
+        caption = text_clip.get_frame(0).astype(np.float32)
+        alpha = text_clip.mask.get_frame(0)[..., None] if text_clip.mask is not None else np.ones(caption.shape[:2] + (1,))
+        return background, caption * alpha, (1 - alpha).astype(np.float32)
+
+    def _still_page_frame(self, page: StoryPage, image_path: Path) -> np.ndarray:
+        """
+        The page as one still frame for the static render mode: the cover caption
+        centred, the other captions anchored to the bottom of the image (or to the
+        top when taller than the image).
+        """
+        image_clip = ImageClip(str(image_path))
+        text_clip = self._create_text_clip(page, image_clip, 1)
+        background, premultiplied, transparency = self._caption_layers(image_clip, text_clip)
+        height, width = background.shape[:2]
+        caption_height, caption_width = premultiplied.shape[:2]
+        x = (width - caption_width) // 2
+        y = (height - caption_height) // 2 if page.page_number == 0 else max(height - caption_height, 0)
+        return _blend_caption(background, premultiplied, transparency, x, y)
+
+    def _precomposed_page_clip(self, page: StoryPage, image_clip: ImageClip, text_clip: TextClip,
+                               duration: float) -> VideoClip:
+        """
+        Fast path for _create_page_clip: the caption is rendered to an RGBA array
+        once, and each frame is the background with the caption band blended in
+        at its scroll offset. The cover page is a single precomposed still.
+        """
+        background, premultiplied, transparency = self._caption_layers(image_clip, text_clip)
+
+        height, width = background.shape[:2]
+        x = (width - premultiplied.shape[1]) // 2
+        if page.page_number == 0:
+            frame = _blend_caption(background, premultiplied, transparency, x, (height - premultiplied.shape[0]) // 2)
+            return ImageClip(frame).with_duration(duration)
+
+        # Same scroll as _getTextPostiton
+        def frame_function(t):
+            y = int(height - t * (premultiplied.shape[0] / duration))
+            return _blend_caption(background, premultiplied, transparency, x, y)
+
+        return VideoClip(frame_function, duration=duration)
         
-    def compile_story_video(self, story: StoryOutput) -> str:
-        """Create a video from a story with images, text, and audio for each page."""
+    def compile_story_video(self, story: StoryOutput,
+                            image_paths: Optional[Sequence[Union[str, Path]]] = None,
+                            audio_paths: Optional[Sequence[Union[str, Path]]] = None,
+                            segmented: bool = False, max_workers: Optional[int] = None) -> str:
+        """
+        Create a video from a story with images, text, and audio for each page.
+
+        image_paths and audio_paths are the assets returned by the generators,
+        in page order. Without them, assets are looked up by the legacy
+        page_{number}_{title} file names.
+
+        With segmented=True each page is rendered to its own segment in a
+        process pool (max_workers processes, default one per core), and the
+        segments are joined with the ffmpeg concat demuxer without re-encoding.
+        Segments are cached by content, so a re-render only encodes the pages
+        that changed. The static render mode always renders segments.
+        """
+        page_assets = self._get_page_assets(story, image_paths, audio_paths)
+        output_video_path = self._output_video_path(story)
+
+        if segmented or self.render_mode == "static":
+            segment_paths = self._render_segments(page_assets, max_workers)
+            self._concat_segments(segment_paths, output_video_path)
+            return str(output_video_path)
+
         # Create clips for each page
         page_clips = []
-        for page in story.pages:
-            # Get the paths to the generated image and audio
-            image_path = self._get_image_path(page, story)
-            audio_path = self._get_audio_path(page, story)
-            
-            if not image_path.exists():
-                raise FileNotFoundError(f"Image not found for page {page.page_number}: {image_path}")
-            if not audio_path.exists():
-                raise FileNotFoundError(f"Audio not found for page {page.page_number}: {audio_path}")
-            
+        for page, image_path, audio_path in page_assets:
             # Create clip for this page
             page_clip = self._create_page_clip(page, image_path, audio_path)
             
@@ -124,16 +300,154 @@ class StoryVideoCompiler:
         # Concatenate all page clips in sequence
         final_clip = concatenate_videoclips(page_clips)
         
-        # Save the video
-        output_video_path = self.output_dir.parent / f"{story.title.lower().replace(' ', '_')}.mp4"
-        final_clip.write_videofile(str(output_video_path), fps=self.fps)
+        self._write_clip(final_clip, output_video_path)
         
         return str(output_video_path)
+
+    async def render_page_segment(self, page: StoryPage, image_path: Union[str, Path], audio_path: Union[str, Path],
+                                  frame_size: Tuple[int, int], pool: Executor) -> Path:
+        """
+        Render one page's segment in pool as soon as its assets exist, for page-level pipelines.
+
+        Every page of a story must use the same frame_size so the segments can
+        be joined by join_segments. Cached segments are reused, and identical
+        pages rendering at the same time share one render.
+        """
+        image_path, audio_path = Path(image_path), Path(audio_path)
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        segment_key = await asyncio.to_thread(self._segment_key, page, image_path, audio_path, frame_size)
+        segment_path = self.segments_dir / f"{segment_key}.mp4"
+        if segment_path.exists():
+            print(f"Reused segment for page {page.page_number}: {segment_path}")
+            return segment_path
+
+        if segment_path not in self._segment_renders:
+            self._segment_renders[segment_path] = asyncio.get_running_loop().run_in_executor(
+                pool, _render_segment, self, page, image_path, audio_path, frame_size, segment_path
+            )
+        try:
+            await asyncio.shield(self._segment_renders[segment_path])
+        finally:
+            if self._segment_renders.get(segment_path) and self._segment_renders[segment_path].done():
+                del self._segment_renders[segment_path]
+        print(f"Rendered segment for page {page.page_number}: {segment_path}")
+        return segment_path
+
+    def join_segments(self, story: StoryOutput, segment_paths: Sequence[Path]) -> str:
+        """Join a story's page segments, in page order, into its video; returns the video path."""
+        output_video_path = self._output_video_path(story)
+        self._concat_segments(list(segment_paths), output_video_path)
+        return str(output_video_path)
+
+    def _output_video_path(self, story: StoryOutput) -> Path:
+        # The content digest keeps stories with the same title apart,
+        # and renders with other profiles (e.g. previews) never overwrite the standard export
+        story_digest = asset_key(story=story.model_dump())[:8]
+        profile_suffix = "" if self.profile_name == "standard" else f"_{self.profile_name}"
+        return self.output_dir.parent / f"{story.title.lower().replace(' ', '_')}_{story_digest}{profile_suffix}.mp4"
+
+    def _output_fps(self) -> int:
+        return self.profile.fps or self.fps
+
+    def _write_clip(self, clip: VideoClip, output_path: Path, **kwargs) -> None:
+        """Encode a clip with the codec, quality, thread and resolution settings of the output profile."""
+        clip.write_videofile(
+            str(output_path), fps=self._output_fps(), codec="libx264", preset=self.profile.preset,
+            audio_codec="aac", audio_bitrate=self.profile.audio_bitrate, threads=self.profile.threads,
+            ffmpeg_params=self.profile.quality_args() + FASTSTART_ARGS,
+            # moviepy's temporary audio track goes next to the output, not into the working directory
+            temp_audiofile_path=str(Path(output_path).parent),
+            **kwargs
+        )
+
+    def _get_page_assets(self, story: StoryOutput,
+                         image_paths: Optional[Sequence[Union[str, Path]]],
+                         audio_paths: Optional[Sequence[Union[str, Path]]]) -> List[Tuple[StoryPage, Path, Path]]:
+        """(page, image_path, audio_path) for every page, checking the assets exist."""
+        page_assets = []
+        for index, page in enumerate(story.pages):
+            # Get the paths to the generated image and audio
+            image_path = Path(image_paths[index]) if image_paths else self._get_image_path(page, story)
+            audio_path = Path(audio_paths[index]) if audio_paths else self._get_audio_path(page, story)
+            
+            if not image_path.exists():
+                raise FileNotFoundError(f"Image not found for page {page.page_number}: {image_path}")
+            if not audio_path.exists():
+                raise FileNotFoundError(f"Audio not found for page {page.page_number}: {audio_path}")
+
+            page_assets.append((page, image_path, audio_path))
+        return page_assets
+
+    def _segment_key(self, page: StoryPage, image_path: Path, audio_path: Path, frame_size: Tuple[int, int]) -> str:
+        """Content address of a page segment: its assets, its text and every render setting."""
+        return asset_key(
+            kind="segment", cover=page.page_number == 0, content=page.content,
+            image=_file_digest(image_path), audio=_file_digest(audio_path), frame_size=frame_size,
+            fps=self._output_fps(), profile=asdict(self.profile), fast_captions=self.fast_captions,
+            render_mode=self.render_mode, static_fps=self.static_fps, page_pause=self.page_pause, mp4=FASTSTART_ARGS,
+            font=self.text_font, font_size=self.text_font_size, color=self.text_color, bg_color=self.text_bg_color,
+            padding=self.text_padding, line_height=self.line_height, margin=self.margin
+        )
+
+    def _render_segments(self, page_assets: List[Tuple[StoryPage, Path, Path]],
+                         max_workers: Optional[int] = None) -> List[Path]:
+        """Render the pages missing from the segment cache in parallel; return every segment in page order."""
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        with Image.open(page_assets[0][1]) as first_image:
+            frame_size = first_image.size
+
+        segment_paths, pending = [], []
+        for page, image_path, audio_path in page_assets:
+            segment_path = self.segments_dir / f"{self._segment_key(page, image_path, audio_path, frame_size)}.mp4"
+            segment_paths.append(segment_path)
+            if segment_path.exists():
+                print(f"Reused segment for page {page.page_number}: {segment_path}")
+            elif segment_path not in [pending_page[-1] for pending_page in pending]:
+                pending.append((page, image_path, audio_path, frame_size, segment_path))
+
+        if pending:
+            with ProcessPoolExecutor(max_workers=max_workers or min(len(pending), os.cpu_count() or 1)) as pool:
+                futures = [pool.submit(_render_segment, self, *pending_page) for pending_page in pending]
+                for (page, *_), future in zip(pending, futures):
+                    print(f"Rendered segment for page {page.page_number}: {future.result()}")
+
+        return segment_paths
+
+    def _concat_segments(self, segment_paths: List[Path], output_video_path: Path) -> None:
+        """Join the segments with the ffmpeg concat demuxer, copying the streams instead of re-encoding."""
+        list_path = output_video_path.with_suffix(".segments.txt")
+        with open(list_path, "w") as f:
+            for segment_path in segment_paths:
+                escaped = str(segment_path.resolve()).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        try:
+            subprocess.run(
+                [FFMPEG_BINARY, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", str(list_path),
+                 "-c", "copy", *FASTSTART_ARGS, str(output_video_path)],
+                check=True
+            )
+        finally:
+            list_path.unlink(missing_ok=True)
         
+    def set_profile(self, profile: str) -> None:
+        """Select a named output profile: preview, standard or archive."""
+        if profile not in OUTPUT_PROFILES:
+            raise ValueError(f"Unknown output profile '{profile}', expected one of: {', '.join(OUTPUT_PROFILES)}")
+        self.profile_name = profile
+        self.profile = OUTPUT_PROFILES[profile]
+
     def set_duration(self, duration: int) -> None:
-        """Set the duration for each page in seconds."""
-        self.duration_per_page = duration
-        
+        """
+        Deprecated: each page lasts as long as its narration plus page_pause, so
+        a fixed page duration is ignored (it was replaced by the narration length
+        of every page before, too).
+        """
+        warnings.warn(
+            "StoryVideoCompiler.set_duration is deprecated and has no effect; "
+            "pages last as long as their narration plus page_pause",
+            DeprecationWarning, stacklevel=2
+        )
+
     def set_text_style(self, font: str = None, font_size: int = None, color: str = None) -> None:
         """Set the text styling options."""
         if font:
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from backend.agents.image_agent import ImageGenerationAgent
+from backend.audio_generator.elevenlabs_storyteller import StoryAudioGenerator
+from backend.movie_generator.movie_compiler import StoryVideoCompiler
+from backend.models import StoryOutput, StoryPage
+
+# Called with (event, page, path) as each asset is finished: "image", "audio" and "segment" for a page,
+# then "video" (with page None) for the joined video
+MediaEventCallback = Callable[[str, Optional[StoryPage], Path], None]
+
+class StoryMediaPipeline:
+    """
+    Page-level media pipeline for a story.
+
+    Each page added is handled on its own: its image and narration are
+    generated at the same time, and its video segment starts rendering (in a
+    pool of max_workers processes) as soon as both exist, while other pages are
+    still being generated, or even still being written. finish() joins the
+    segments once every page is done, so the total time approaches that of the
+    slowest page rather than the sum of the stages.
+
+    Use it as an async context manager, which owns the render processes.
+    Long-running processes should create the image agent and audio generator
+    once and pass them in, so every story shares their connection pools and
+    limits; ones the pipeline creates itself are closed when it exits.
+    """
+
+    def __init__(self, output_dir: Path, voice_id: Optional[str] = None, profile: Optional[str] = None,
+                 max_workers: Optional[int] = None, on_event: Optional[MediaEventCallback] = None,
+                 image_agent: Optional[ImageGenerationAgent] = None,
+                 audio_generator: Optional[StoryAudioGenerator] = None):
+        self.output_dir = output_dir
+        self.voice_id = voice_id
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.on_event = on_event
+        self._owned_clients = []
+        if image_agent is None:
+            image_agent = ImageGenerationAgent()
+            self._owned_clients.append(image_agent)
+        if audio_generator is None:
+            audio_generator = StoryAudioGenerator(output_dir=output_dir / "audio")
+            self._owned_clients.append(audio_generator)
+        self.image_agent = image_agent
+        self.audio_generator = audio_generator
+        self.video_compiler = StoryVideoCompiler(output_dir=output_dir,
+                                                 profile=profile or os.getenv("VIDEO_PROFILE", "standard"))
+        # Every segment uses the generated image size, so the segments can be joined without re-encoding
+        self.frame_size = tuple(int(side) for side in self.image_agent.image_size.split("x"))
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self._pages: Dict[int, StoryPage] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def __aenter__(self) -> "StoryMediaPipeline":
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        # Stop pages that are no longer needed (e.g. after a failure) before closing the pool
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        await asyncio.to_thread(self.pool.shutdown, wait=True, cancel_futures=True)
+        for client in self._owned_clients:
+            await client.aclose()
+
+    def add_page(self, page: StoryPage) -> None:
+        """Start producing a page's media; a page added again with other content replaces the earlier one."""
+        if self._pages.get(page.page_number) == page:
+            return
+        if page.page_number in self._tasks:
+            self._tasks[page.page_number].cancel()
+        self._pages[page.page_number] = page
+        self._tasks[page.page_number] = asyncio.create_task(self._produce_page(page))
+
+    async def finish(self, story: StoryOutput) -> str:
+        """Wait for every page of the finished story and join their segments; returns the video path."""
+        for page in story.pages:
+            self.add_page(page)
+        tasks = [self._tasks[page.page_number] for page in story.pages]
+
+        # Let every page finish, then report the first failure
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        segment_paths = results
+
+        video_path = await asyncio.to_thread(self.video_compiler.join_segments, story, segment_paths)
+        self._notify("video", None, video_path)
+        return video_path
+
+    def _notify(self, event: str, page: Optional[StoryPage], path) -> None:
+        if self.on_event:
+            self.on_event(event, page, Path(path))
+
+    async def _produce_page(self, page: StoryPage) -> Path:
+        async def generate_image() -> str:
+            image_path, _ = await self.image_agent.generate_page_image(page, str(self.output_dir / "images"))
+            self._notify("image", page, image_path)
+            return image_path
+
+        async def generate_audio() -> Path:
+            audio_path, _ = await self.audio_generator.generate_page_audio(page, self.voice_id)
+            self._notify("audio", page, audio_path)
+            return audio_path
+
+        try:
+            image_path, audio_path = await asyncio.gather(generate_image(), generate_audio())
+            print(f"Generated image and audio for page {page.page_number}")
+            segment_path = await self.video_compiler.render_page_segment(
+                page, image_path, audio_path, self.frame_size, self.pool
+            )
+            self._notify("segment", page, segment_path)
+            return segment_path
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Page {page.page_number} failed: {str(e)}") from e
+
+async def produce_story_media(story: StoryOutput, output_dir: Path, voice_id: Optional[str] = None,
+                              profile: Optional[str] = None, max_workers: Optional[int] = None,
+                              on_event: Optional[MediaEventCallback] = None,
+                              image_agent: Optional[ImageGenerationAgent] = None,
+                              audio_generator: Optional[StoryAudioGenerator] = None) -> str:
+    """Produce the video for a finished story with the page-level pipeline; returns the video path."""
+    async with StoryMediaPipeline(output_dir, voice_id, profile,
+                                  max_workers or min(len(story.pages), os.cpu_count() or 1), on_event,
+                                  image_agent, audio_generator) as pipeline:
+        return await pipeline.finish(story)
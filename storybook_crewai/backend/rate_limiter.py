@@ -0,0 +1,23 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+
+class AsyncRateLimiter:
+    """Spaces out calls so that at most `requests_per_minute` of them start per minute, across tasks."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()  # Never held across an await, so it is safe on any event loop
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        """Wait for the next free slot (returns immediately when the limit is disabled)."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        await asyncio.sleep(slot - now)
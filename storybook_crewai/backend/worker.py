@@ -0,0 +1,186 @@
+"""
+Storybook compilation workers
+
+Runs the jobs queued by the API: images, narration and video for each story,
+produced page by page (see backend/pipeline.py). Every job runs in a worker
+process, so encoding never competes with the API's event loop, and
+`--concurrency` jobs run at once. Each worker runs its jobs on one event loop
+and shares one image and one narration client between them. Progress and an event for every finished
+asset are written to the job queue, so they survive restarts of both the API
+and the workers; jobs interrupted by a restart are started again and reuse
+every asset already generated.
+
+Usage:
+    python backend/worker.py --concurrency 2
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from dotenv import load_dotenv
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from backend.job_queue import JobQueue
+from backend.models import StoryOutput
+
+if TYPE_CHECKING:
+    from backend.agents.image_agent import ImageGenerationAgent
+    from backend.audio_generator.elevenlabs_storyteller import StoryAudioGenerator
+
+COMPILE_JOB = "compile_storybook"
+POLL_INTERVAL = 1.0  # Seconds an idle worker waits before checking the queue again
+
+
+class WorkerClients:
+    """
+    The image and narration clients of a worker process, created on first use
+    and shared by all its jobs. Their connection pools and semaphores belong to
+    the worker's event loop, which runs for as long as the worker.
+    """
+
+    def __init__(self):
+        self._image_agent: Optional["ImageGenerationAgent"] = None
+        self._audio_generator: Optional["StoryAudioGenerator"] = None
+
+    def image_agent(self) -> "ImageGenerationAgent":
+        if self._image_agent is None:
+            from backend.agents.image_agent import ImageGenerationAgent
+            self._image_agent = ImageGenerationAgent()
+        return self._image_agent
+
+    def audio_generator(self) -> "StoryAudioGenerator":
+        if self._audio_generator is None:
+            from backend.audio_generator.elevenlabs_storyteller import StoryAudioGenerator
+            self._audio_generator = StoryAudioGenerator(output_dir=project_root / "output" / "audio")
+        return self._audio_generator
+
+    async def aclose(self) -> None:
+        for client in (self._image_agent, self._audio_generator):
+            if client is not None:
+                await client.aclose()
+
+
+async def compile_storybook(queue: JobQueue, job_id: str, payload: dict, clients: WorkerClients) -> dict:
+    """Produce the images, narration and video for a queued story, recording an event for every finished asset."""
+    # Imported here so the pool supervisor stays light; each worker loads it once
+    from backend.pipeline import produce_story_media
+
+    story = StoryOutput(**payload["story"])
+    total = len(story.pages)
+    stages = {"image": "images", "audio": "audio", "segment": "segments"}
+    done = {stage: 0 for stage in stages.values()}
+    assets = {stage: {} for stage in stages.values()}
+
+    def on_event(event, page, path):
+        if event == "video":
+            queue.add_event(job_id, "video", path=str(path))
+            return
+        stage = stages[event]
+        done[stage] += 1
+        assets[stage][page.page_number] = str(path)
+        queue.add_event(job_id, event, page_number=page.page_number, path=str(path))
+        if all(count == total for count in done.values()):
+            queue.update(job_id, "compiling_video", "Joining page segments", stage, done=done[stage], total=total)
+        else:
+            queue.update(job_id, "generating_pages", f"Page {page.page_number} {event} ready", stage,
+                         done=done[stage], total=total)
+
+    queue.update(job_id, "generating_pages", "Generating images and narration for each page")
+    video_path = await produce_story_media(
+        story, project_root / "output", voice_id=payload.get("voice_id"), profile=payload.get("profile"),
+        on_event=on_event, image_agent=clients.image_agent(), audio_generator=clients.audio_generator()
+    )
+
+    return {
+        "video_path": str(video_path),
+        "image_paths": [assets["images"][page.page_number] for page in story.pages],
+        "audio_paths": [assets["audio"][page.page_number] for page in story.pages],
+    }
+
+
+JOB_HANDLERS = {
+    COMPILE_JOB: compile_storybook,
+}
+
+
+def run_worker(name: str, db_path: str) -> None:
+    """Claim and run jobs one at a time until the process is stopped."""
+    load_dotenv()
+    try:
+        asyncio.run(_work(name, JobQueue(db_path)))
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        print(f"[{name}] Stopped")
+
+
+async def _work(name: str, queue: JobQueue) -> None:
+    # SIGTERM from the supervisor cancels the running job, which is requeued at the next start,
+    # and the clients are closed on this loop
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    clients = WorkerClients()
+    print(f"[{name}] Waiting for jobs")
+    try:
+        while True:
+            job = queue.claim(name)
+            if job is None:
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+
+            print(f"[{name}] Started job {job['id']} ({job['kind']})")
+            try:
+                handler = JOB_HANDLERS[job["kind"]]
+                result = await handler(queue, job["id"], job["payload"], clients)
+                queue.complete(job["id"], result, "Storybook compilation completed")
+                print(f"[{name}] Completed job {job['id']}")
+            except Exception as e:
+                queue.fail(job["id"], str(e))
+                print(f"[{name}] Job {job['id']} failed: {str(e)}")
+    finally:
+        await clients.aclose()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run storybook compilation workers.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("JOB_WORKERS", "1")),
+                        help="Jobs run at the same time (default: JOB_WORKERS or 1)")
+    parser.add_argument("--db", default=None, help="Job queue database (default: JOB_DB_PATH or output/jobs.sqlite3)")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.db)
+    requeued = queue.requeue_unfinished()
+    if requeued:
+        print(f"Requeued {requeued} unfinished job(s)")
+
+    # Not daemonic: the video compiler starts its own process pool inside each worker
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(f"worker-{n}", str(queue.db_path)), name=f"worker-{n}")
+        for n in range(args.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def stop(signum, frame):
+        for worker in workers:
+            worker.terminate()
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        stop(None, None)
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()